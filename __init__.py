@@ -2,12 +2,14 @@
 
 import os
 
-from CTFd.plugins import register_plugin_assets_directory
+from CTFd.plugins import register_admin_plugin_menu_bar, register_plugin_assets_directory
 from CTFd.plugins.challenges import CHALLENGE_CLASSES
 from CTFd.models import db
 
 from .python.k8s import K8sChallenge
+from . import events, reconciler
 from .models import K8sChallengeConfig, K8sInstanceSession
+from .routes.admin import admin_blueprint
 from .routes.k8s import k8s_blueprint
 
 
@@ -17,6 +19,10 @@ def load(app):
 
     # Backend API routes used by the frontend
     app.register_blueprint(k8s_blueprint, url_prefix="/plugins/dynamic_instances")
+    app.register_blueprint(admin_blueprint, url_prefix="/plugins/dynamic_instances")
+
+    # Admin dashboard entry in the admin navbar
+    register_admin_plugin_menu_bar(title="Instances", route="/plugins/dynamic_instances/admin/instances")
 
     # Create plugin tables and optionally purge sessions on startup
     with app.app_context():
@@ -25,6 +31,12 @@ def load(app):
             db.session.query(K8sInstanceSession).delete()
             db.session.commit()
 
+    # Background batch writer for lifecycle events
+    events.init_app(app)
+
+    # Periodic cleanup of orphaned resources and stale sessions
+    reconciler.init_app(app)
+
     # Static assets (JS/CSS) exposed to the browser
     register_plugin_assets_directory(
         app,
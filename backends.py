@@ -0,0 +1,273 @@
+# plugins/dynamic_instances/backends.py
+
+"""Pluggable runtime backends.
+
+Routes talk to ``get_backend()`` instead of importing runtime functions, so the
+Kubernetes implementation can be swapped for the async variant or the
+in-memory simulator with ``K8S_RUNTIME_BACKEND``. Whichever backend is
+selected is wrapped in ``GuardedBackend`` (retries, circuit breaker and
+last-known-good status).
+"""
+
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from CTFd.cache import cache
+
+from . import runtime
+from .breaker import BackendUnavailable, CircuitBreaker, is_transient
+
+
+class RuntimeBackend(ABC):
+    """Interface every runtime backend implements; missing methods fail at construction."""
+
+    name = None
+
+    @abstractmethod
+    def start_instance(self, *, user_id, challenge_id, image, tag=None, port=80, check_generations=False):
+        """Create an instance and return its id, status and TTL data.
+
+        ``check_generations`` asks the backend to adopt a live instance under
+        any name before creating one; callers pass it when they have no session.
+        """
+
+    @abstractmethod
+    def stop_instance(self, instance_id):
+        """Delete an instance; missing resources are not an error."""
+
+    @abstractmethod
+    def stop_instances_for(self, user_id, challenge_id):
+        """Delete every instance for a user+challenge."""
+
+    @abstractmethod
+    def find_existing_instance(self, user_id, challenge_id):
+        """Return the newest instance id for a user+challenge, or None."""
+
+    @abstractmethod
+    def extend_instance(self, instance_id, seconds=None):
+        """Push back an instance's expiry, capped by the max TTL."""
+
+    @abstractmethod
+    def get_status(self, instance_id):
+        """Return status, connection info and TTL data for an instance."""
+
+    @abstractmethod
+    def list_instances(self):
+        """Describe every live instance (used by the admin snapshot)."""
+
+    @abstractmethod
+    def list_inventory(self):
+        """Return {"deployments": {name: info}, "services": {name: info}} for reconciliation.
+
+        Deployment info has ``labels``, ``created_at`` and ``expires_at``;
+        service info has ``labels`` and ``created_at``.
+        """
+
+    @abstractmethod
+    def delete_resources(self, deployments=(), services=()):
+        """Delete resources by name and return the names that could not be deleted."""
+
+
+class KubernetesBackend(RuntimeBackend):
+    """Synchronous Kubernetes backend (``runtime`` module)."""
+
+    name = "sync"
+
+    def start_instance(self, *, user_id, challenge_id, image, tag=None, port=80, check_generations=False):
+        return runtime.start_instance(
+            user_id=user_id,
+            challenge_id=challenge_id,
+            image=image,
+            tag=tag,
+            port=port,
+            check_generations=check_generations,
+        )
+
+    def stop_instance(self, instance_id):
+        return runtime.stop_instance(instance_id)
+
+    def stop_instances_for(self, user_id, challenge_id):
+        return runtime.stop_instances_for(user_id, challenge_id)
+
+    def find_existing_instance(self, user_id, challenge_id):
+        return runtime.find_existing_instance(user_id, challenge_id)
+
+    def extend_instance(self, instance_id, seconds=None):
+        return runtime.extend_instance(instance_id, seconds=seconds)
+
+    def get_status(self, instance_id):
+        return runtime.get_status(instance_id)
+
+    def list_instances(self):
+        return runtime.list_instances()
+
+    def list_inventory(self):
+        return runtime.list_inventory()
+
+    def delete_resources(self, deployments=(), services=()):
+        return runtime.delete_resources(deployments=deployments, services=services)
+
+
+class AsyncKubernetesBackend(KubernetesBackend):
+    """Kubernetes backend with concurrent status reads and deletes."""
+
+    name = "async"
+
+    def __init__(self):
+        from . import runtime_async
+
+        self._async = runtime_async
+
+    def stop_instance(self, instance_id):
+        return self._async.stop_instance(instance_id)
+
+    def stop_instances_for(self, user_id, challenge_id):
+        return self._async.stop_instances_for(user_id, challenge_id)
+
+    def get_status(self, instance_id):
+        return self._async.get_status(instance_id)
+
+
+def _env_int(name, default, minimum=1):
+    try:
+        value = int(os.getenv(name, str(default)))
+        return value if value >= minimum else default
+    except (TypeError, ValueError):
+        return default
+
+
+_STATUS_KEY = "dynamic_instances:last_status:{}"
+
+
+class GuardedBackend(RuntimeBackend):
+    """Wrap a backend with retries, a circuit breaker and last-known-good status.
+
+    Idempotent reads and starts are retried with jittered backoff. Transient failures
+    feed the breaker; while it is open, mutating calls raise
+    BackendUnavailable immediately and get_status serves the last good
+    status marked ``stale``.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+        self.breaker = CircuitBreaker(
+            failure_threshold=_env_int("K8S_BREAKER_FAILURES", 5),
+            reset_seconds=_env_int("K8S_BREAKER_RESET_SECONDS", 30),
+        )
+        self.retries = _env_int("K8S_API_RETRIES", 2, minimum=0)
+        self.backoff = _env_int("K8S_API_RETRY_BACKOFF_MS", 200, minimum=0) / 1000.0
+        self.stale_seconds = _env_int("K8S_STATUS_STALE_SECONDS", 600)
+
+    def _call(self, fn, *args, retry=False, **kwargs):
+        if not self.breaker.allow():
+            raise BackendUnavailable("Kubernetes API circuit open")
+        attempts = 1 + (self.retries if retry else 0)
+        for attempt in range(attempts):
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                if not is_transient(exc):
+                    # The API answered; the error is about the request, not its health
+                    self.breaker.record_success()
+                    raise
+                if attempt + 1 < attempts:
+                    time.sleep(random.uniform(0, self.backoff * 2**attempt))
+                    continue
+                self.breaker.record_failure()
+                raise BackendUnavailable(str(exc)) from exc
+            self.breaker.record_success()
+            return result
+
+    def start_instance(self, *, user_id, challenge_id, image, tag=None, port=80, check_generations=False):
+        return self._call(
+            self.inner.start_instance,
+            user_id=user_id,
+            challenge_id=challenge_id,
+            image=image,
+            tag=tag,
+            port=port,
+            check_generations=check_generations,
+            # Deterministic names make a retried start converge instead of duplicating
+            retry=True,
+        )
+
+    def stop_instance(self, instance_id):
+        result = self._call(self.inner.stop_instance, instance_id)
+        # Only after the delete went through; a failed stop keeps the stale fallback
+        cache.delete(_STATUS_KEY.format(instance_id))
+        return result
+
+    def stop_instances_for(self, user_id, challenge_id):
+        return self._call(self.inner.stop_instances_for, user_id, challenge_id)
+
+    def find_existing_instance(self, user_id, challenge_id):
+        return self._call(self.inner.find_existing_instance, user_id, challenge_id, retry=True)
+
+    def extend_instance(self, instance_id, seconds=None):
+        return self._call(self.inner.extend_instance, instance_id, seconds=seconds)
+
+    def get_status(self, instance_id):
+        key = _STATUS_KEY.format(instance_id)
+        try:
+            result = self._call(self.inner.get_status, instance_id, retry=True)
+        except BackendUnavailable:
+            last = cache.get(key)
+            if last is None:
+                raise
+            stale = {**last, "stale": True}
+            if stale.get("expires_at") is not None:
+                remaining = max(stale["expires_at"] - int(time.time()), 0)
+                stale["ttl_remaining"] = min(remaining, stale.get("ttl_remaining", remaining))
+            return stale
+        if result.get("status") in {"stopped", "expired"}:
+            cache.delete(key)
+        else:
+            cache.set(key, result, timeout=self.stale_seconds)
+        return result
+
+    def list_instances(self):
+        return self._call(self.inner.list_instances, retry=True)
+
+    def list_inventory(self):
+        return self._call(self.inner.list_inventory, retry=True)
+
+    def delete_resources(self, deployments=(), services=()):
+        return self._call(self.inner.delete_resources, deployments=deployments, services=services)
+
+
+def _simulator_backend():
+    from .simulator import SimulatedBackend
+
+    return SimulatedBackend()
+
+
+_FACTORIES = {
+    "sync": KubernetesBackend,
+    "async": AsyncKubernetesBackend,
+    "simulator": _simulator_backend,
+}
+
+_backend = None
+_backend_guard = threading.Lock()
+
+
+def _backend_name():
+    """Selected backend; MOCK_K8S is kept as an alias for the simulator."""
+    if os.getenv("MOCK_K8S", "false").lower() in {"1", "true", "yes"}:
+        return "simulator"
+    name = os.getenv("K8S_RUNTIME_BACKEND", "sync").lower()
+    return name if name in _FACTORIES else "sync"
+
+
+def get_backend():
+    """Return the process-wide runtime backend."""
+    global _backend
+    if _backend is None:
+        with _backend_guard:
+            if _backend is None:
+                _backend = GuardedBackend(_FACTORIES[_backend_name()]())
+    return _backend
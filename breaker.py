@@ -0,0 +1,87 @@
+# plugins/dynamic_instances/breaker.py
+
+"""Circuit breaker, failure classification and errors surfaced by runtime calls."""
+
+import asyncio
+import threading
+import time
+
+from kubernetes.client import ApiException
+from urllib3.exceptions import HTTPError
+
+try:
+    from kubernetes_asyncio.client.rest import ApiException as AsyncApiException
+except ImportError:
+    API_ERRORS = (ApiException,)
+else:
+    API_ERRORS = (ApiException, AsyncApiException)
+
+
+class BackendUnavailable(Exception):
+    """The runtime backend is failing or the breaker is open; callers should 503."""
+
+
+class InstanceBusy(Exception):
+    """Every instance name for a user+challenge is still in use or shutting down; callers should 409."""
+
+
+def is_transient(exc):
+    """True for failures that mean the API is down or overloaded.
+
+    An API that answers 404/409/403 is healthy, so those do not count; 5xx,
+    429, timeouts and connection errors do.
+    """
+    status = getattr(exc, "status", None)
+    if isinstance(status, int) and status:
+        return status >= 500 or status == 429
+    return isinstance(exc, (OSError, HTTPError, asyncio.TimeoutError, TimeoutError)) or (
+        type(exc).__name__ == "ApiException"
+    )
+
+
+class CircuitBreaker:
+    """Classic closed -> open -> half-open breaker, per process.
+
+    Opens after ``failure_threshold`` consecutive transient failures, rejects
+    calls for ``reset_seconds``, then lets a single trial call through.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.time() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """Whether a call may go through right now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.time() - self._opened_at < self.reset_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.time()
+            self._trial_in_flight = False
@@ -0,0 +1,134 @@
+# plugins/dynamic_instances/events.py
+
+"""Buffered lifecycle event log.
+
+``record_event`` only appends to an in-memory buffer; a background thread
+flushes the buffer to ``k8s_instance_event`` in batches, so request handlers
+never wait on an insert.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from CTFd.models import db
+
+from .models import K8sInstanceEvent
+
+logger = logging.getLogger("dynamic_instances")
+
+EVENT_START = "start"
+EVENT_READY = "ready"
+EVENT_EXTEND = "extend"
+EVENT_STOP = "stop"
+EVENT_EXPIRE = "expire"
+EVENT_EVICT = "evict"
+
+_buffer = deque()
+_wakeup = threading.Event()
+_flush_guard = threading.Lock()
+_app = None
+_thread = None
+
+
+def _flush_seconds():
+    """Maximum delay between a recorded event and its insert."""
+    try:
+        value = float(os.getenv("K8S_EVENT_FLUSH_SECONDS", "5"))
+        return value if value > 0 else 5.0
+    except (TypeError, ValueError):
+        return 5.0
+
+
+def _batch_size():
+    """Buffered events that trigger an early flush."""
+    try:
+        value = int(os.getenv("K8S_EVENT_BATCH_SIZE", "200"))
+        return value if value > 0 else 200
+    except (TypeError, ValueError):
+        return 200
+
+
+def _max_buffered():
+    """Cap on events kept for retry while the database is unavailable."""
+    try:
+        value = int(os.getenv("K8S_EVENT_MAX_BUFFERED", "50000"))
+        return value if value > 0 else 50000
+    except (TypeError, ValueError):
+        return 50000
+
+
+def _requeue(rows):
+    """Put a failed batch back at the front of the buffer, dropping the oldest over the cap."""
+    room = _max_buffered() - len(_buffer)
+    if room < len(rows):
+        logger.error("Event buffer full; dropping %d lifecycle events", len(rows) - max(room, 0))
+        rows = rows[len(rows) - max(room, 0) :]
+    _buffer.extendleft(reversed(rows))
+
+
+def record_event(event, *, user_id=None, challenge_id=None, instance_id=None):
+    """Queue a lifecycle event; never touches the database."""
+    _buffer.append(
+        {
+            "event": event,
+            "user_id": user_id,
+            "challenge_id": int(challenge_id) if challenge_id is not None else None,
+            "instance_id": instance_id,
+            "created_at": datetime.utcnow(),
+        }
+    )
+    if len(_buffer) >= _batch_size():
+        _wakeup.set()
+
+
+def flush():
+    """Insert all buffered events in one batch (requires an app context)."""
+    with _flush_guard:
+        rows = []
+        while _buffer:
+            rows.append(_buffer.popleft())
+        if not rows:
+            return 0
+        try:
+            db.session.execute(K8sInstanceEvent.__table__.insert(), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Keep the rows for the next interval; a short outage should not lose them
+            _requeue(rows)
+            logger.exception("Failed to flush %d lifecycle events; will retry", len(rows))
+            return 0
+        return len(rows)
+
+
+def _flush_loop():
+    while True:
+        _wakeup.wait(_flush_seconds())
+        _wakeup.clear()
+        with _app.app_context():
+            flushed = flush()
+        if not flushed and _buffer:
+            # The insert failed; wait a full interval instead of retrying on every new event
+            time.sleep(_flush_seconds())
+
+
+def _flush_at_exit():
+    if _app is None:
+        return
+    with _app.app_context():
+        flush()
+
+
+def init_app(app):
+    """Start the background flusher for this process."""
+    global _app, _thread
+    _app = app
+    if _thread is None:
+        _thread = threading.Thread(target=_flush_loop, name="dynamic-instances-events", daemon=True)
+        _thread.start()
+        atexit.register(_flush_at_exit)
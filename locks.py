@@ -0,0 +1,159 @@
+# plugins/dynamic_instances/locks.py
+
+"""Distributed start locks and single-flight coalescing for instance starts.
+
+Locks live in the CTFd cache (Redis in multi-worker deployments), so they are
+shared across workers and expire on their own when a holder dies. On Redis the
+release is an atomic compare-and-delete; other cache backends can only check
+and delete in two steps, so exclusion there is best-effort.
+"""
+
+import os
+import threading
+import time
+import uuid
+
+from CTFd.cache import cache
+
+_LOCK_PREFIX = "dynamic_instances:start_lock"
+_RESULT_PREFIX = "dynamic_instances:start_result"
+_POLL_INTERVAL = 0.25
+
+# Delete the lock only if it still holds our token
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# In-process flights keyed by (user_id, challenge_id)
+_flights = {}
+_flights_guard = threading.Lock()
+
+
+def _lease_seconds():
+    """Lease length for a start lock; stale locks expire after this."""
+    try:
+        value = int(os.getenv("K8S_START_LOCK_SECONDS", "60"))
+        return value if value > 0 else 60
+    except (TypeError, ValueError):
+        return 60
+
+
+def _wait_seconds():
+    """How long coalesced callers wait for the leader's result."""
+    try:
+        value = int(os.getenv("K8S_START_WAIT_SECONDS", "15"))
+        return value if value >= 0 else 15
+    except (TypeError, ValueError):
+        return 15
+
+
+def _lock_key(user_id, challenge_id):
+    return f"{_LOCK_PREFIX}:{user_id}:{challenge_id}"
+
+
+def _result_key(user_id, challenge_id):
+    return f"{_RESULT_PREFIX}:{user_id}:{challenge_id}"
+
+
+def acquire_start_lock(user_id, challenge_id):
+    """Try to take the start lock; return a token on success, None if held."""
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(user_id, challenge_id), token, timeout=_lease_seconds()):
+        return token
+    return None
+
+
+def _redis_release(key, token):
+    """Compare-and-delete in one Redis call; returns False if the cache is not Redis."""
+    backend = getattr(cache, "cache", None)
+    client = getattr(backend, "_write_client", None) or getattr(backend, "_client", None)
+    if client is None or not hasattr(client, "eval"):
+        return False
+    # Compare against the value exactly as the cache backend stored it
+    serializer = getattr(backend, "serializer", None)
+    stored = serializer.dumps(token) if serializer is not None else backend.dump_object(token)
+    client.eval(_RELEASE_SCRIPT, 1, f"{backend.key_prefix or ''}{key}", stored)
+    return True
+
+
+def release_start_lock(user_id, challenge_id, token):
+    """Release the start lock if it is still ours (the lease may have expired)."""
+    key = _lock_key(user_id, challenge_id)
+    if _redis_release(key, token):
+        return
+    # Best-effort fallback: the lease can expire and be retaken between these calls
+    if cache.get(key) == token:
+        cache.delete(key)
+
+
+def _await_remote_result(user_id, challenge_id):
+    """Wait for another worker's start to publish its result."""
+    lock_key = _lock_key(user_id, challenge_id)
+    result_key = _result_key(user_id, challenge_id)
+    token = cache.get(lock_key)
+    deadline = time.time() + _wait_seconds()
+    while True:
+        published = cache.get(result_key)
+        if published and published.get("token") == token:
+            return published.get("result")
+        if token is None or cache.get(lock_key) != token or time.time() >= deadline:
+            return None
+        time.sleep(_POLL_INTERVAL)
+
+
+class _Flight:
+    """Shared state for callers coalesced onto one in-process start."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def single_flight(user_id, challenge_id, fn):
+    """Run ``fn`` once per user+challenge and hand every caller its result.
+
+    Callers in the same process wait on the leader directly; callers in other
+    workers find the lock held and wait for the leader to publish the result.
+    Returns None when the wait times out and the start is still in progress.
+    """
+    key = (user_id, challenge_id)
+    with _flights_guard:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _flights[key] = flight
+
+    if not leader:
+        flight.done.wait(_wait_seconds())
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        token = acquire_start_lock(user_id, challenge_id)
+        if token is None:
+            result = _await_remote_result(user_id, challenge_id)
+        else:
+            try:
+                result = fn()
+                cache.set(
+                    _result_key(user_id, challenge_id),
+                    {"token": token, "result": result},
+                    timeout=max(_wait_seconds(), 1),
+                )
+            finally:
+                release_start_lock(user_id, challenge_id, token)
+        flight.result = result
+        return result
+    except Exception as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _flights_guard:
+            _flights.pop(key, None)
+        flight.done.set()
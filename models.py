@@ -35,3 +35,16 @@ class K8sInstanceSession(db.Model):
 
     # One active session per user+challenge
     __table_args__ = (db.UniqueConstraint("user_id", "challenge_id", name="uq_k8s_instance_session"),)
+
+
+class K8sInstanceEvent(db.Model):
+    """Append-only lifecycle event (start/ready/extend/stop/expire/evict) for analytics."""
+    __tablename__ = "k8s_instance_event"
+
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(16), nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    challenge_id = db.Column(db.Integer, nullable=True)
+    instance_id = db.Column(db.String(128), nullable=True)
+    # Event time as recorded on the hot path, not when the batch was flushed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,105 @@
+# plugins/dynamic_instances/nodes.py
+
+"""Cached node name -> address index for NodePort endpoints.
+
+The index is filled by one LIST and then kept current by a node watch on a
+background thread, so status calls never list nodes themselves.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from kubernetes import watch
+from kubernetes.client import ApiException
+
+logger = logging.getLogger("dynamic_instances")
+
+_addresses = {}
+_guard = threading.Lock()
+_ready = threading.Event()
+_thread = None
+# Set once a lookup has waited for the initial LIST, whether or not it arrived
+_waited = False
+_thread_guard = threading.Lock()
+
+
+def _address_types():
+    """Node address types to use, in order of preference."""
+    raw = os.getenv("K8S_NODE_ADDRESS_TYPES", "ExternalIP,InternalIP")
+    return [t.strip() for t in raw.split(",") if t.strip()]
+
+
+def _pick_address(node):
+    addresses = (node.status.addresses or []) if node.status else []
+    by_type = {addr.type: addr.address for addr in addresses}
+    for address_type in _address_types():
+        if by_type.get(address_type):
+            return by_type[address_type]
+    return None
+
+
+def _relist(core):
+    nodes = core.list_node()
+    with _guard:
+        _addresses.clear()
+        _addresses.update({node.metadata.name: _pick_address(node) for node in nodes.items})
+    _ready.set()
+    return nodes.metadata.resource_version
+
+
+def _watch_loop(core):
+    resource_version = None
+    while True:
+        try:
+            if resource_version is None:
+                resource_version = _relist(core)
+            stream = watch.Watch().stream(core.list_node, resource_version=resource_version, timeout_seconds=300)
+            for event in stream:
+                node = event["object"]
+                if event["type"] == "ERROR":
+                    # Usually 410 Gone: our resource version is too old
+                    resource_version = None
+                    break
+                name = node.metadata.name
+                with _guard:
+                    if event["type"] == "DELETED":
+                        _addresses.pop(name, None)
+                    else:
+                        _addresses[name] = _pick_address(node)
+                resource_version = node.metadata.resource_version
+        except ApiException as exc:
+            if getattr(exc, "status", None) != 410:
+                logger.warning("Node watch failed; relisting", exc_info=exc)
+                time.sleep(5)
+            resource_version = None
+        except Exception:
+            logger.warning("Node watch failed; relisting", exc_info=True)
+            resource_version = None
+            time.sleep(5)
+
+
+def _ensure_watch(core):
+    global _thread
+    if _thread is not None:
+        return
+    with _thread_guard:
+        if _thread is None:
+            _thread = threading.Thread(target=_watch_loop, args=(core,), name="dynamic-instances-nodes", daemon=True)
+            _thread.start()
+
+
+def node_address(core, node_name):
+    """Return the preferred address of a node, or None if unknown."""
+    global _waited
+    if not node_name:
+        return None
+    _ensure_watch(core)
+    # Wait for the initial LIST at most once per process; if it keeps failing
+    # (e.g. no list permission on nodes) later lookups must not stall
+    if not _waited and not _ready.is_set():
+        _ready.wait(2)
+        _waited = True
+    with _guard:
+        return _addresses.get(node_name)
@@ -0,0 +1,183 @@
+# plugins/dynamic_instances/quota.py
+
+"""Per-user (or per-team) limit on concurrently running instances.
+
+Recency comes from a ``last_seen`` entry in the CTFd cache that the status
+and extend routes refresh, falling back to the session's ``updated_at``, so
+making room for a new start needs one session query and no cluster LISTs.
+"""
+
+import calendar
+import logging
+import os
+import time
+
+from CTFd.cache import cache
+from CTFd.models import Challenges, Users, db
+
+from .breaker import BackendUnavailable
+from .events import EVENT_EVICT, record_event
+from .models import K8sInstanceSession
+
+logger = logging.getLogger("dynamic_instances")
+
+_SEEN_KEY = "dynamic_instances:last_seen:{}"
+_SEEN_TIMEOUT = 86400
+
+
+class QuotaExceeded(Exception):
+    """A start would exceed the instance quota and the policy is ``reject``."""
+
+    def __init__(self, limit, running):
+        self.limit = limit
+        self.running = running
+        names = ", ".join(
+            item["challenge_name"] if item["owned"] else f"{item['challenge_name']} ({item['user_name']})"
+            for item in running
+        )
+        super().__init__(
+            f"You can run at most {limit} instance{'s' if limit != 1 else ''} at once. "
+            f"Stop one first: {names}"
+        )
+
+
+def _limit():
+    """Maximum concurrent instances per scope; 0 disables the quota."""
+    try:
+        value = int(os.getenv("K8S_INSTANCE_QUOTA", "0"))
+        return value if value >= 0 else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def _scope():
+    """``user`` or ``team``; team scope falls back to the user without a team."""
+    value = os.getenv("K8S_INSTANCE_QUOTA_SCOPE", "user").strip().lower()
+    return value if value in {"user", "team"} else "user"
+
+
+def _policy():
+    """``evict`` the least recently used instance or ``reject`` the start."""
+    value = os.getenv("K8S_INSTANCE_QUOTA_POLICY", "evict").strip().lower()
+    return value if value in {"evict", "reject"} else "evict"
+
+
+def touch(instance_id, expires_at=None):
+    """Record that the player just used an instance."""
+    if instance_id:
+        cache.set(
+            _SEEN_KEY.format(instance_id),
+            {"at": int(time.time()), "expires_at": expires_at},
+            timeout=_SEEN_TIMEOUT,
+        )
+
+
+def forget(instance_id):
+    """Drop the last seen entry of an instance that is gone."""
+    cache.delete(_SEEN_KEY.format(instance_id))
+
+
+def _scope_sessions(user, challenge_id):
+    """Sessions counted against the user's quota, minus the one being started."""
+    query = K8sInstanceSession.query
+    if _scope() == "team" and getattr(user, "team_id", None):
+        query = query.join(Users, Users.id == K8sInstanceSession.user_id).filter(Users.team_id == user.team_id)
+    else:
+        query = query.filter(K8sInstanceSession.user_id == user.id)
+    sessions = query.all()
+    return [
+        s
+        for s in sessions
+        if not (s.user_id == user.id and s.challenge_id == challenge_id) and not s.instance_id.startswith("starting")
+    ]
+
+
+def _describe(sessions, user):
+    """Plain descriptions of sessions for responses, events and deletion."""
+    challenge_ids = {s.challenge_id for s in sessions}
+    user_ids = {s.user_id for s in sessions}
+    challenges = (
+        dict(db.session.query(Challenges.id, Challenges.name).filter(Challenges.id.in_(challenge_ids)).all())
+        if challenge_ids
+        else {}
+    )
+    users = dict(db.session.query(Users.id, Users.name).filter(Users.id.in_(user_ids)).all()) if user_ids else {}
+    return [
+        {
+            "session_id": s.id,
+            "instance_id": s.instance_id,
+            "user_id": s.user_id,
+            "user_name": users.get(s.user_id),
+            # False for a teammate's instance in team scope
+            "owned": s.user_id == user.id,
+            "challenge_id": s.challenge_id,
+            "challenge_name": challenges.get(s.challenge_id, f"Challenge {s.challenge_id}"),
+        }
+        for s in sessions
+    ]
+
+
+def plan_room(user, challenge_id):
+    """Decide which sessions a new start has to free, without touching anything.
+
+    Returns ``{"released": [...], "evicted": [...]}``. Sessions whose last
+    seen expiry has passed are released first and are not reported; live
+    instances are evicted least recently used first, or QuotaExceeded is
+    raised when the policy is ``reject``.
+    """
+    plan = {"released": [], "evicted": []}
+    limit = _limit()
+    if not limit:
+        return plan
+    sessions = _scope_sessions(user, challenge_id)
+    needed = len(sessions) - limit + 1
+    if needed <= 0:
+        return plan
+
+    now = int(time.time())
+    seen = cache.get_many(*[_SEEN_KEY.format(s.instance_id) for s in sessions])
+    expired, live = [], []
+    for session, info in zip(sessions, seen):
+        expires_at = (info or {}).get("expires_at")
+        if expires_at is not None and expires_at <= now:
+            expired.append(session)
+        else:
+            last_used = info["at"] if info else calendar.timegm(session.updated_at.utctimetuple())
+            live.append((last_used, session))
+    live = [session for _, session in sorted(live, key=lambda item: item[0])]
+
+    released = expired[:needed]
+    evicted = live[: needed - len(released)]
+    if evicted and _policy() == "reject":
+        raise QuotaExceeded(limit, _describe(live, user))
+    return {"released": _describe(released, user), "evicted": _describe(evicted, user)}
+
+
+def make_room(backend, plan):
+    """Carry out a plan from plan_room and return the evicted instances.
+
+    Call this only after the new instance started, so a failed start never
+    costs the player an instance. An instance whose stop fails keeps its
+    session and is not reported; the start itself has already succeeded.
+    """
+    freed = []
+    for item in plan["released"] + plan["evicted"]:
+        try:
+            backend.stop_instance(item["instance_id"])
+        except BackendUnavailable:
+            logger.warning("Could not evict instance %s", item["instance_id"], exc_info=True)
+            continue
+        forget(item["instance_id"])
+        freed.append(item)
+    if not freed:
+        return []
+    K8sInstanceSession.query.filter(
+        K8sInstanceSession.id.in_([item["session_id"] for item in freed])
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    evicted = [item for item in freed if item in plan["evicted"]]
+    for item in evicted:
+        record_event(
+            EVENT_EVICT, user_id=item["user_id"], challenge_id=item["challenge_id"], instance_id=item["instance_id"]
+        )
+    return evicted
@@ -0,0 +1,203 @@
+# plugins/dynamic_instances/reconciler.py
+
+"""Periodic reconciliation of cluster resources against the session table.
+
+Each pass does one LIST per resource kind, diffs it against
+``K8sInstanceSession`` in memory and removes the drift in batches:
+
+- Services without a Deployment (failed deletes, half-finished stops)
+- Deployments past their ``expires_at`` (nobody polled status after expiry)
+- Deployments without a session (crashed starts, lost session rows)
+- Sessions without a Deployment (instances deleted out of band)
+- Legacy ``starting:`` sentinel sessions older than the grace period
+
+Removed instances get the same ``expire``/``stop`` lifecycle events a player
+action would have recorded, so every instance in the event log has an end.
+
+Only one worker reconciles per interval; the pass is guarded by a cache lock.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from CTFd.cache import cache
+from CTFd.models import db
+
+from .backends import get_backend
+from .events import EVENT_EXPIRE, EVENT_STOP, record_event
+from .models import K8sInstanceSession
+
+logger = logging.getLogger("dynamic_instances")
+
+_LOCK_KEY = "dynamic_instances:reconcile_lock"
+_REPORT_KEY = "dynamic_instances:reconcile_report"
+_BATCH = 500
+
+_app = None
+_thread = None
+
+
+def _interval_seconds():
+    """Seconds between passes; 0 disables the background reconciler."""
+    try:
+        value = int(os.getenv("K8S_RECONCILE_SECONDS", "300"))
+        return value if value >= 0 else 300
+    except (TypeError, ValueError):
+        return 300
+
+
+def _grace_seconds():
+    """Minimum age before a resource or session counts as drift."""
+    try:
+        value = int(os.getenv("K8S_RECONCILE_GRACE_SECONDS", "120"))
+        return value if value >= 0 else 120
+    except (TypeError, ValueError):
+        return 120
+
+
+def _chunks(items, size=_BATCH):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _old_enough(created_at, cutoff):
+    # Unknown age is treated as old; otherwise a missing annotation would pin drift forever
+    return created_at is None or created_at <= cutoff
+
+
+def _label_int(labels, key):
+    try:
+        return int(labels.get(key))
+    except (TypeError, ValueError):
+        return None
+
+
+def _record_removed(event, name, info):
+    """Log a lifecycle event for a deleted Deployment, using its user/challenge labels."""
+    labels = info["labels"]
+    record_event(
+        event,
+        user_id=_label_int(labels, "user_id"),
+        challenge_id=_label_int(labels, "challenge_id"),
+        instance_id=name,
+    )
+
+
+def reconcile():
+    """Run one reconciliation pass and return its report (requires an app context)."""
+    started = time.time()
+    cutoff = int(started) - _grace_seconds()
+    session_cutoff = datetime.utcnow() - timedelta(seconds=_grace_seconds())
+    backend = get_backend()
+
+    inventory = backend.list_inventory()
+    deployments = inventory["deployments"]
+    services = inventory["services"]
+    sessions = db.session.query(
+        K8sInstanceSession.id,
+        K8sInstanceSession.user_id,
+        K8sInstanceSession.challenge_id,
+        K8sInstanceSession.instance_id,
+        K8sInstanceSession.updated_at,
+    ).all()
+    session_ids = {row.instance_id for row in sessions}
+
+    # TTL is only enforced when status is polled; expire what nobody is watching
+    expired_deployments = [
+        name
+        for name, info in deployments.items()
+        if info.get("expires_at") is not None and info["expires_at"] <= int(started)
+    ]
+    expired = set(expired_deployments)
+    orphan_services = [
+        name for name, info in services.items() if name not in deployments and _old_enough(info["created_at"], cutoff)
+    ]
+    orphan_deployments = [
+        name
+        for name, info in deployments.items()
+        if name not in session_ids and name not in expired and _old_enough(info["created_at"], cutoff)
+    ]
+    stale_sentinels = [
+        row.id for row in sessions if row.instance_id.startswith("starting") and row.updated_at <= session_cutoff
+    ]
+    dangling_sessions = [
+        row
+        for row in sessions
+        if not row.instance_id.startswith("starting")
+        and row.instance_id not in deployments
+        and row.updated_at <= session_cutoff
+    ]
+
+    failed = []
+    for batch in _chunks(orphan_services):
+        failed += backend.delete_resources(services=batch)
+    for event, names in ((EVENT_EXPIRE, expired_deployments), (EVENT_STOP, orphan_deployments)):
+        for batch in _chunks(names):
+            # Delete the matching Service too so the pass does not leave a new orphan
+            batch_failed = backend.delete_resources(
+                deployments=batch, services=[name for name in batch if name in services]
+            )
+            failed += batch_failed
+            for name in batch:
+                if name not in batch_failed:
+                    _record_removed(event, name, deployments[name])
+    # Sessions of expired instances go with them, unless the delete failed and the next pass retries
+    expired_sessions = [row.id for row in sessions if row.instance_id in expired and row.instance_id not in failed]
+    removed_sessions = stale_sentinels + [row.id for row in dangling_sessions] + expired_sessions
+    for batch in _chunks(removed_sessions):
+        K8sInstanceSession.query.filter(K8sInstanceSession.id.in_(batch)).delete(synchronize_session=False)
+    if removed_sessions:
+        db.session.commit()
+    for row in dangling_sessions:
+        # The Deployment vanished out of band; close the instance's lifetime here
+        record_event(EVENT_STOP, user_id=row.user_id, challenge_id=row.challenge_id, instance_id=row.instance_id)
+
+    report = {
+        "finished_at": int(time.time()),
+        "duration_ms": int((time.time() - started) * 1000),
+        "deployments_seen": len(deployments),
+        "services_seen": len(services),
+        "sessions_seen": len(sessions),
+        "orphan_services": len(orphan_services),
+        "expired_deployments": len(expired_deployments),
+        "orphan_deployments": len(orphan_deployments),
+        "dangling_sessions": len(dangling_sessions),
+        "stale_sentinels": len(stale_sentinels),
+        "failed": failed,
+    }
+    cache.set(_REPORT_KEY, report, timeout=0)
+    logger.info("Reconcile pass finished", extra={"report": report})
+    return report
+
+
+def last_report():
+    """Report from the most recent pass on any worker, or None."""
+    return cache.get(_REPORT_KEY)
+
+
+def _loop():
+    while True:
+        interval = _interval_seconds()
+        time.sleep(interval)
+        # One worker per interval; the lock expires on its own if a pass dies
+        if not cache.add(_LOCK_KEY, 1, timeout=max(interval - 1, 1)):
+            continue
+        with _app.app_context():
+            try:
+                reconcile()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Reconcile pass failed")
+
+
+def init_app(app):
+    """Start the background reconciler for this process (unless disabled)."""
+    global _app, _thread
+    _app = app
+    if _thread is None and _interval_seconds() > 0:
+        _thread = threading.Thread(target=_loop, name="dynamic-instances-reconcile", daemon=True)
+        _thread.start()
@@ -0,0 +1,247 @@
+# plugins/dynamic_instances/routes/admin.py
+
+import csv
+import io
+import json
+import logging
+
+from flask import Blueprint, Response, jsonify, render_template, request, stream_with_context
+from kubernetes.config.config_exception import ConfigException
+from CTFd.models import Challenges, Users, db
+from CTFd.utils.decorators import admins_only
+
+from ..backends import get_backend
+from ..breaker import BackendUnavailable
+from ..events import EVENT_EXTEND, EVENT_STOP, record_event
+from ..models import K8sInstanceEvent, K8sInstanceSession
+from ..reconciler import last_report, reconcile
+from ..snapshot import SnapshotWarmingUp, get_snapshot, query_snapshot, update_snapshot
+
+admin_blueprint = Blueprint("dynamic_instances_admin", __name__)
+logger = logging.getLogger("dynamic_instances")
+
+_MAX_PER_PAGE = 500
+
+
+def _instance_ids(payload):
+    """Validated list of instance ids from a bulk action payload."""
+    ids = payload.get("instance_ids") or []
+    if isinstance(ids, str):
+        ids = [ids]
+    return [str(i) for i in ids if i]
+
+
+def _snapshot_index():
+    """Map instance id to its snapshot row (user/challenge for bookkeeping)."""
+    return {item["instance_id"]: item for item in get_snapshot()["instances"]}
+
+
+@admin_blueprint.route("/admin/instances", methods=["GET"])
+@admins_only
+def instances_page():
+    """Admin dashboard listing live instances."""
+    return render_template("plugins/dynamic_instances/templates/k8s_admin_instances.html")
+
+
+@admin_blueprint.route("/admin/instances/data", methods=["GET"])
+@admins_only
+def instances_data():
+    """Sorted, filtered and paginated instances from the cached snapshot."""
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 50, type=int), 1), _MAX_PER_PAGE)
+    try:
+        rows, total, taken_at = query_snapshot(
+            user_id=request.args.get("user_id", type=int),
+            challenge_id=request.args.get("challenge_id", type=int),
+            phase=request.args.get("phase") or None,
+            q=request.args.get("q") or None,
+            sort=request.args.get("sort", "age"),
+            order=request.args.get("order", "desc"),
+            page=page,
+            per_page=per_page,
+        )
+    except ConfigException as exc:
+        logger.warning("Kubernetes config not available", exc_info=exc)
+        return jsonify({"success": False, "message": "Kubernetes config not available"}), 503
+    except SnapshotWarmingUp:
+        return jsonify({"success": False, "message": "Instance list is warming up, retry shortly"}), 503
+    except BackendUnavailable as exc:
+        logger.warning("Kubernetes API unavailable", exc_info=exc)
+        return jsonify({"success": False, "message": "Kubernetes API unavailable"}), 503
+
+    # Resolve names for the visible page only
+    user_ids = {row["user_id"] for row in rows if row.get("user_id") is not None}
+    challenge_ids = {row["challenge_id"] for row in rows if row.get("challenge_id") is not None}
+    user_names = {}
+    if user_ids:
+        user_names = dict(db.session.query(Users.id, Users.name).filter(Users.id.in_(user_ids)).all())
+    challenge_names = {}
+    if challenge_ids:
+        challenge_names = dict(
+            db.session.query(Challenges.id, Challenges.name).filter(Challenges.id.in_(challenge_ids)).all()
+        )
+    for row in rows:
+        row["user_name"] = user_names.get(row.get("user_id"))
+        row["challenge_name"] = challenge_names.get(row.get("challenge_id"))
+
+    return jsonify(
+        {
+            "success": True,
+            "data": rows,
+            "meta": {
+                "page": page,
+                "per_page": per_page,
+                "total": total,
+                "pages": (total + per_page - 1) // per_page,
+                "snapshot_at": taken_at,
+            },
+        }
+    )
+
+
+@admin_blueprint.route("/admin/instances/stop", methods=["POST"])
+@admins_only
+def instances_stop():
+    """Stop one or more instances and drop their sessions."""
+    ids = _instance_ids(request.get_json() or {})
+    if not ids:
+        return jsonify({"success": False, "message": "instance_ids required"}), 400
+    try:
+        index = _snapshot_index()
+        for instance_id in ids:
+            get_backend().stop_instance(instance_id)
+    except ConfigException as exc:
+        logger.warning("Kubernetes config not available", exc_info=exc)
+        return jsonify({"success": False, "message": "Kubernetes config not available"}), 503
+    except BackendUnavailable as exc:
+        logger.warning("Kubernetes API unavailable", exc_info=exc)
+        return jsonify({"success": False, "message": "Kubernetes API unavailable"}), 503
+
+    K8sInstanceSession.query.filter(K8sInstanceSession.instance_id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+    for instance_id in ids:
+        item = index.get(instance_id, {})
+        record_event(
+            EVENT_STOP,
+            user_id=item.get("user_id"),
+            challenge_id=item.get("challenge_id"),
+            instance_id=instance_id,
+        )
+    update_snapshot(removed=ids)
+    return jsonify({"success": True, "data": {"stopped": ids}})
+
+
+@admin_blueprint.route("/admin/instances/extend", methods=["POST"])
+@admins_only
+def instances_extend():
+    """Extend the TTL of one or more instances."""
+    payload = request.get_json() or {}
+    ids = _instance_ids(payload)
+    if not ids:
+        return jsonify({"success": False, "message": "instance_ids required"}), 400
+    extend_seconds = payload.get("extend_seconds")
+    results = {}
+    failed = []
+    try:
+        index = _snapshot_index()
+        for instance_id in ids:
+            try:
+                results[instance_id] = get_backend().extend_instance(instance_id, seconds=extend_seconds)
+            except (ConfigException, BackendUnavailable):
+                raise
+            except Exception:
+                logger.warning("Failed to extend %s", instance_id, exc_info=True)
+                failed.append(instance_id)
+    except ConfigException as exc:
+        logger.warning("Kubernetes config not available", exc_info=exc)
+        return jsonify({"success": False, "message": "Kubernetes config not available"}), 503
+    except BackendUnavailable as exc:
+        logger.warning("Kubernetes API unavailable", exc_info=exc)
+        return jsonify({"success": False, "message": "Kubernetes API unavailable"}), 503
+
+    for instance_id in results:
+        item = index.get(instance_id, {})
+        record_event(
+            EVENT_EXTEND,
+            user_id=item.get("user_id"),
+            challenge_id=item.get("challenge_id"),
+            instance_id=instance_id,
+        )
+    update_snapshot(updated={i: {"expires_at": r["expires_at"]} for i, r in results.items()})
+    return jsonify({"success": not failed, "data": {"extended": results, "failed": failed}})
+
+
+@admin_blueprint.route("/admin/reconcile", methods=["GET"])
+@admins_only
+def reconcile_report():
+    """Report from the most recent reconciliation pass."""
+    return jsonify({"success": True, "data": last_report()})
+
+
+@admin_blueprint.route("/admin/reconcile", methods=["POST"])
+@admins_only
+def reconcile_now():
+    """Run a reconciliation pass immediately."""
+    try:
+        report = reconcile()
+    except ConfigException as exc:
+        logger.warning("Kubernetes config not available", exc_info=exc)
+        return jsonify({"success": False, "message": "Kubernetes config not available"}), 503
+    except BackendUnavailable as exc:
+        logger.warning("Kubernetes API unavailable", exc_info=exc)
+        return jsonify({"success": False, "message": "Kubernetes API unavailable"}), 503
+    return jsonify({"success": True, "data": report})
+
+
+_EVENT_FIELDS = ["id", "event", "user_id", "challenge_id", "instance_id", "created_at"]
+
+
+def _event_row(event):
+    return {
+        "id": event.id,
+        "event": event.event,
+        "user_id": event.user_id,
+        "challenge_id": event.challenge_id,
+        "instance_id": event.instance_id,
+        "created_at": event.created_at.isoformat() + "Z",
+    }
+
+
+@admin_blueprint.route("/admin/events", methods=["GET"])
+@admins_only
+def export_events():
+    """Stream lifecycle events as CSV (default) or NDJSON (?format=ndjson)."""
+    fmt = request.args.get("format", "csv").lower()
+    query = K8sInstanceEvent.query.order_by(K8sInstanceEvent.id)
+    challenge_id = request.args.get("challenge_id", type=int)
+    if challenge_id:
+        query = query.filter_by(challenge_id=challenge_id)
+    since_id = request.args.get("since_id", type=int)
+    if since_id:
+        query = query.filter(K8sInstanceEvent.id > since_id)
+
+    def _rows():
+        # yield_per keeps memory flat regardless of table size
+        for event in query.yield_per(1000):
+            yield _event_row(event)
+
+    if fmt == "ndjson":
+        body = (json.dumps(row) + "\n" for row in _rows())
+        return Response(stream_with_context(body), mimetype="application/x-ndjson")
+
+    def _csv():
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=_EVENT_FIELDS)
+        writer.writeheader()
+        for row in _rows():
+            writer.writerow(row)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+        yield buf.getvalue()
+
+    return Response(
+        stream_with_context(_csv()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=k8s_instance_events.csv"},
+    )
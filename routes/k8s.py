@@ -1,42 +1,52 @@
 # plugins/dynamic_instances/routes.py
 
 import logging
-import os
-import time
-import uuid
 
 from flask import Blueprint, request, jsonify
 from kubernetes.config.config_exception import ConfigException
 from sqlalchemy.exc import IntegrityError
+from CTFd.cache import cache
 from CTFd.utils.decorators import authed_only
 from CTFd.utils.user import get_current_user
 from CTFd.models import Challenges, db
 
-from ..runtime import (
-    start_instance,
-    stop_instance,
-    stop_instances_for,
-    get_status,
-    extend_instance,
-    find_existing_instance,
+from ..backends import get_backend
+from ..breaker import API_ERRORS, BackendUnavailable, InstanceBusy
+from ..events import (
+    EVENT_EXPIRE,
+    EVENT_EXTEND,
+    EVENT_READY,
+    EVENT_START,
+    EVENT_STOP,
+    record_event,
 )
+from ..locks import single_flight
 from ..python.k8s import _unpack_connection_info
 from ..models import K8sChallengeConfig, K8sInstanceSession
+from ..quota import QuotaExceeded, forget, make_room, plan_room, touch
 
 k8s_blueprint = Blueprint("dynamic_instances", __name__)
 logger = logging.getLogger("dynamic_instances")
 
 
-def _mock_enabled():
-    """Enable mock responses for UI testing without Kubernetes."""
-    return os.getenv("MOCK_K8S", "false").lower() in {"1", "true", "yes"}
-
-
 def _get_session(user_id, challenge_id):
     """Fetch the active instance session for a user+challenge."""
     return K8sInstanceSession.query.filter_by(user_id=user_id, challenge_id=challenge_id).first()
 
 
+def _owned_session(user_id, challenge_id=None, instance_id=None):
+    """The caller's session for a challenge, or for an instance id they own.
+
+    A client-supplied instance id is never acted on directly; only a session
+    row of the caller proves the instance is theirs.
+    """
+    if challenge_id:
+        return _get_session(user_id, int(challenge_id))
+    if instance_id:
+        return K8sInstanceSession.query.filter_by(user_id=user_id, instance_id=instance_id).first()
+    return None
+
+
 def _set_session(user_id, challenge_id, instance_id):
     """Upsert the instance session for a user+challenge."""
     session = _get_session(user_id, challenge_id)
@@ -45,7 +55,15 @@ def _set_session(user_id, challenge_id, instance_id):
     else:
         session = K8sInstanceSession(user_id=user_id, challenge_id=challenge_id, instance_id=instance_id)
     db.session.add(session)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker inserted the row first; point the existing row at this instance
+        db.session.rollback()
+        session = _get_session(user_id, challenge_id)
+        if session and session.instance_id != instance_id:
+            session.instance_id = instance_id
+            db.session.commit()
     return session
 
 
@@ -61,17 +79,47 @@ def _clear_session(user_id, challenge_id, instance_id=None):
         db.session.commit()
 
 
+def _record_status_events(user_id, challenge_id, result):
+    """Record expire, and ready the first time any worker sees the pod running."""
+    instance_id = result.get("instance_id")
+    if result.get("status") == "expired":
+        record_event(EVENT_EXPIRE, user_id=user_id, challenge_id=challenge_id, instance_id=instance_id)
+    elif result.get("pod_phase") == "Running" and instance_id:
+        if cache.add(f"dynamic_instances:ready:{instance_id}", 1, timeout=86400):
+            record_event(EVENT_READY, user_id=user_id, challenge_id=challenge_id, instance_id=instance_id)
+
+
+def _record_start_event(user_id, challenge_id, result):
+    """Record start once per Deployment.
+
+    A start can converge on a Deployment that a timed-out (and retried) or
+    crashed attempt created, so "already-running" does not mean the start was
+    recorded; the Deployment's created_at tells incarnations apart.
+    """
+    instance_id = result["instance_id"]
+    key = f"dynamic_instances:started:{instance_id}:{result.get('created_at')}"
+    if result.get("created_at") is not None and cache.add(key, 1, timeout=86400):
+        record_event(EVENT_START, user_id=user_id, challenge_id=challenge_id, instance_id=instance_id)
+
+
+def _api_error(exc):
+    """JSON response for a Kubernetes API error that is not an outage (401/403/422...)."""
+    status = getattr(exc, "status", None)
+    logger.warning("Kubernetes API rejected the request", exc_info=exc)
+    if status == 404:
+        return jsonify({"status": "error", "message": "Instance not found"}), 404
+    # The plugin's credentials or request were refused, not the player's
+    return jsonify({"status": "error", "message": f"Kubernetes API rejected the request ({status})"}), 502
+
+
 @k8s_blueprint.route("/dynamic/start", methods=["POST"])
 @authed_only
 def start():
     """Start a new instance or return the current one if it exists."""
     user = get_current_user()
+    backend = get_backend()
     data = request.get_json()
     logger.info("/dynamic/start called", extra={"user_id": user.id, "payload": data})
-    if _mock_enabled():
-        instance_id = f"mock-u{user.id}-c{data['challenge_id']}-{int(time.time())}"
-        _set_session(user.id, data["challenge_id"], instance_id)
-        return jsonify({"instance_id": instance_id, "status": "starting"})
     challenge = Challenges.query.get_or_404(data["challenge_id"])
     config = K8sChallengeConfig.query.filter_by(challenge_id=challenge.id).first()
     if config:
@@ -81,52 +129,63 @@ def start():
     try:
         session = _get_session(user.id, challenge.id)
         if session:
-            if session.instance_id.startswith("starting"):
-                return jsonify({"status": "starting", "instance_id": session.instance_id})
-            existing_status = get_status(session.instance_id)
+            existing_status = backend.get_status(session.instance_id)
+            _record_status_events(user.id, challenge.id, existing_status)
             existing_state = existing_status.get("status") or existing_status.get("pod_phase")
             if existing_state in {"starting", "creating", "pending", "Pending"}:
-                stop_instance(session.instance_id)
+                backend.stop_instance(session.instance_id)
                 _clear_session(user.id, challenge.id, session.instance_id)
+                record_event(EVENT_STOP, user_id=user.id, challenge_id=challenge.id, instance_id=session.instance_id)
                 return jsonify({"status": "stopped_existing", "instance_id": session.instance_id})
             if existing_state not in {"stopped", "expired"}:
                 return jsonify({"status": "already-running", **existing_status})
-        existing_id = find_existing_instance(user.id, challenge.id)
-        if existing_id:
-            existing_status = get_status(existing_id)
-            existing_state = existing_status.get("status") or existing_status.get("pod_phase")
-            if existing_state in {"starting", "creating", "pending", "Pending"}:
-                stop_instance(existing_id)
-                return jsonify({"status": "stopped_existing", "instance_id": existing_id})
-            if existing_state not in {"stopped", "expired"}:
-                _set_session(user.id, challenge.id, existing_id)
-                return jsonify({"status": "already-running", **existing_status})
-        try:
-            lock_id = f"starting:{uuid.uuid4().hex[:8]}"
-            _set_session(user.id, challenge.id, lock_id)
-        except IntegrityError:
-            db.session.rollback()
-            session = _get_session(user.id, challenge.id)
-            if session:
-                if session.instance_id.startswith("starting"):
-                    return jsonify({"status": "starting", "instance_id": session.instance_id})
-                return jsonify({"status": "already-running", "instance_id": session.instance_id})
-        result = start_instance(
-            user_id=user.id,
-            challenge_id=challenge.id,
-            image=image,
-            tag=tag,
-            port=port or 80,
-        )
-        if result.get("instance_id"):
-            _set_session(user.id, challenge.id, result["instance_id"])
+
+        def _start():
+            # Re-check under the lock: another worker may have just finished. End
+            # the transaction first so the read sees rows committed since (MySQL
+            # REPEATABLE READ) and the cached session row is reloaded.
+            db.session.commit()
+            current = _get_session(user.id, challenge.id)
+            if current and (not session or current.instance_id != session.instance_id):
+                return {"status": "already-running", "instance_id": current.instance_id}
+            # Decide what to evict up front (reject fails fast), evict only once the start worked
+            plan = plan_room(user, challenge.id)
+            result = backend.start_instance(
+                user_id=user.id,
+                challenge_id=challenge.id,
+                image=image,
+                tag=tag,
+                port=port or 80,
+                # Without a session a later generation may still be running
+                check_generations=current is None,
+            )
+            if result.get("instance_id"):
+                _set_session(user.id, challenge.id, result["instance_id"])
+                _record_start_event(user.id, challenge.id, result)
+                touch(result["instance_id"], result.get("expires_at"))
+                evicted = make_room(backend, plan)
+                if evicted:
+                    result = {**result, "evicted": evicted}
+            return result
+
+        result = single_flight(user.id, challenge.id, _start)
+        if result is None:
+            return jsonify({"status": "starting"})
         return jsonify(result)
+    except QuotaExceeded as exc:
+        return jsonify({"status": "error", "message": str(exc), "running": exc.running}), 409
+    except InstanceBusy as exc:
+        logger.info("No free instance name", exc_info=exc)
+        message = "Your previous instance is still shutting down, try again shortly"
+        return jsonify({"status": "error", "message": message}), 409
     except ConfigException as exc:
         logger.warning("Kubernetes config not available", exc_info=exc)
         return jsonify({"status": "error", "message": "Kubernetes config not available"}), 503
-    except Exception:
-        _clear_session(user.id, challenge.id)
-        raise
+    except BackendUnavailable as exc:
+        logger.warning("Kubernetes API unavailable", exc_info=exc)
+        return jsonify({"status": "error", "message": "Kubernetes API unavailable, try again shortly"}), 503
+    except API_ERRORS as exc:
+        return _api_error(exc)
 
 
 @k8s_blueprint.route("/dynamic/status", methods=["GET"])
@@ -134,64 +193,75 @@ def start():
 def status():
     """Return instance status and reconcile stale sessions."""
     user = get_current_user()
+    backend = get_backend()
     instance_id = request.args.get("instance_id")
     challenge_id = request.args.get("challenge_id")
     logger.info(
         "/dynamic/status called",
         extra={"instance_id": instance_id, "challenge_id": challenge_id, "args": dict(request.args)},
     )
-    if _mock_enabled():
-        if not instance_id and challenge_id:
-            session = _get_session(user.id, int(challenge_id))
-            instance_id = session.instance_id if session else None
-        return jsonify({"instance_id": instance_id, "status": "running", "ip": "127.0.0.1"})
     try:
+        session = _owned_session(user.id, challenge_id, instance_id)
+        instance_id = session.instance_id if session else None
+        if session and not challenge_id:
+            challenge_id = session.challenge_id
         if not instance_id and challenge_id:
-            session = _get_session(user.id, int(challenge_id))
-            if session and session.instance_id.startswith("starting"):
-                return jsonify({"status": "starting", "instance_id": session.instance_id})
-            instance_id = session.instance_id if session else None
-        if not instance_id and challenge_id:
-            instance_id = find_existing_instance(user.id, int(challenge_id))
+            instance_id = backend.find_existing_instance(user.id, int(challenge_id))
             if instance_id:
                 _set_session(user.id, int(challenge_id), instance_id)
         if not instance_id:
             return jsonify({"status": "stopped", "ttl_remaining": 0})
-        result = get_status(instance_id)
+        result = backend.get_status(instance_id)
+        _record_status_events(user.id, challenge_id, result)
         state = result.get("status") or result.get("pod_phase")
-        if challenge_id and state in {"expired", "stopped"}:
-            _clear_session(user.id, int(challenge_id), instance_id)
+        if state in {"expired", "stopped"}:
+            forget(instance_id)
+            if challenge_id:
+                _clear_session(user.id, int(challenge_id), instance_id)
+        elif not result.get("stale"):
+            touch(instance_id, result.get("expires_at"))
         return jsonify(result)
     except ConfigException as exc:
         logger.warning("Kubernetes config not available", exc_info=exc)
         return jsonify({"status": "error", "message": "Kubernetes config not available"}), 503
+    except BackendUnavailable as exc:
+        logger.warning("Kubernetes API unavailable", exc_info=exc)
+        return jsonify({"status": "error", "message": "Kubernetes API unavailable, try again shortly"}), 503
+    except API_ERRORS as exc:
+        return _api_error(exc)
 
 
 @k8s_blueprint.route("/dynamic/stop", methods=["POST"])
 @authed_only
 def stop():
     """Stop and clean up an instance for a user+challenge."""
+    backend = get_backend()
     payload = request.get_json() or {}
     logger.info("/dynamic/stop called", extra={"payload": payload})
-    if _mock_enabled():
-        if payload.get("challenge_id"):
-            _clear_session(get_current_user().id, payload["challenge_id"], payload.get("instance_id"))
-        return jsonify({"status": "stopped"})
     try:
-        instance_id = payload.get("instance_id")
+        user_id = get_current_user().id
         challenge_id = payload.get("challenge_id")
-        if not instance_id and challenge_id:
-            session = _get_session(get_current_user().id, challenge_id)
-            instance_id = session.instance_id if session else None
+        session = _owned_session(user_id, challenge_id, payload.get("instance_id"))
+        instance_id = session.instance_id if session else None
+        if session and not challenge_id:
+            challenge_id = session.challenge_id
         if instance_id:
-            stop_instance(instance_id)
+            backend.stop_instance(instance_id)
+            forget(instance_id)
         if challenge_id:
-            stop_instances_for(get_current_user().id, challenge_id)
+            backend.stop_instances_for(user_id, challenge_id)
         if challenge_id:
-            _clear_session(get_current_user().id, challenge_id, instance_id)
+            _clear_session(user_id, challenge_id, instance_id)
+        if instance_id or challenge_id:
+            record_event(EVENT_STOP, user_id=user_id, challenge_id=challenge_id, instance_id=instance_id)
     except ConfigException as exc:
         logger.warning("Kubernetes config not available", exc_info=exc)
         return jsonify({"status": "error", "message": "Kubernetes config not available"}), 503
+    except BackendUnavailable as exc:
+        logger.warning("Kubernetes API unavailable", exc_info=exc)
+        return jsonify({"status": "error", "message": "Kubernetes API unavailable, try again shortly"}), 503
+    except API_ERRORS as exc:
+        return _api_error(exc)
     return jsonify({"status": "stopped"})
 
 
@@ -200,21 +270,27 @@ def stop():
 def extend():
     """Extend an instance TTL for a user+challenge."""
     payload = request.get_json() or {}
-    instance_id = payload.get("instance_id")
+    challenge_id = payload.get("challenge_id")
     extend_seconds = payload.get("extend_seconds")
     logger.info("/dynamic/extend called", extra={"payload": payload})
-    if not instance_id:
-        challenge_id = payload.get("challenge_id")
-        if challenge_id:
-            session = _get_session(get_current_user().id, challenge_id)
-            instance_id = session.instance_id if session else None
-    if not instance_id:
+    if not challenge_id and not payload.get("instance_id"):
         return jsonify({"status": "error", "message": "instance_id required"}), 400
-    if _mock_enabled():
-        return jsonify({"instance_id": instance_id, "status": "extended"})
+    session = _owned_session(get_current_user().id, challenge_id, payload.get("instance_id"))
+    if not session:
+        return jsonify({"status": "error", "message": "No running instance"}), 404
+    instance_id = session.instance_id
+    challenge_id = challenge_id or session.challenge_id
     try:
-        result = extend_instance(instance_id, seconds=extend_seconds)
+        result = get_backend().extend_instance(instance_id, seconds=extend_seconds)
+        touch(instance_id, result.get("expires_at"))
+        record_event(EVENT_EXTEND, user_id=get_current_user().id, challenge_id=challenge_id, instance_id=instance_id)
         return jsonify(result)
     except ConfigException as exc:
         logger.warning("Kubernetes config not available", exc_info=exc)
         return jsonify({"status": "error", "message": "Kubernetes config not available"}), 503
+    except BackendUnavailable as exc:
+        logger.warning("Kubernetes API unavailable", exc_info=exc)
+        return jsonify({"status": "error", "message": "Kubernetes API unavailable, try again shortly"}), 503
+    except API_ERRORS as exc:
+        return _api_error(exc)
+
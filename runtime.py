@@ -1,13 +1,20 @@
 # plugins/dynamic_instances/runtime.py
 
+import hashlib
+import hmac
 import os
 import time
-import uuid
+from flask import current_app, has_app_context
 from kubernetes import client, config
 from kubernetes.client import ApiException
 
+from .breaker import InstanceBusy
+from .nodes import node_address
+
 _core = None
 _apps = None
+# Namespaces known to exist; checked once per process
+_namespaces_ready = set()
 
 
 def _load():
@@ -33,9 +40,28 @@ def _ns():
     return os.getenv("K8S_NAMESPACE", "per-user")
 
 
-def _name(user_id, challenge_id):
-    """Stable-ish resource name per user/challenge instance."""
-    return f"ctf-u{user_id}-c{challenge_id}-{uuid.uuid4().hex[:6]}"
+# Generations to try when earlier ones are still terminating
+_MAX_GENERATIONS = 5
+
+
+def _name_key():
+    """Secret keying instance names, so players cannot compute each other's.
+
+    K8S_INSTANCE_NAME_SECRET, else CTFd's SECRET_KEY; must match on every worker.
+    """
+    secret = os.getenv("K8S_INSTANCE_NAME_SECRET")
+    if not secret and has_app_context():
+        secret = current_app.config.get("SECRET_KEY")
+    if isinstance(secret, str):
+        secret = secret.encode()
+    return secret or b""
+
+
+def _name(user_id, challenge_id, generation=0):
+    """Deterministic resource name per user/challenge and generation."""
+    message = f"{user_id}:{challenge_id}:{generation}".encode()
+    digest = hmac.new(_name_key(), message, hashlib.sha256).hexdigest()[:10]
+    return f"ctf-u{user_id}-c{challenge_id}-{digest}"
 
 
 def _instance_labels(user_id, challenge_id, name=None):
@@ -50,6 +76,17 @@ def _instance_labels(user_id, challenge_id, name=None):
     return labels
 
 
+def _instance_selector(user_id, challenge_id):
+    """Label selector matching every instance for a user+challenge."""
+    return ",".join(
+        [
+            "component=user-instance",
+            f"user_id={user_id}",
+            f"challenge_id={challenge_id}",
+        ]
+    )
+
+
 def _image_pull_secrets():
     """Parse imagePullSecrets from env (comma-separated)."""
     raw = os.getenv("K8S_IMAGE_PULL_SECRETS", "").strip()
@@ -62,17 +99,30 @@ def _image_pull_secrets():
 
 
 def _ensure_namespace():
-    """Create namespace if it doesn't exist."""
+    """Create namespace if it doesn't exist (checked once per process)."""
     _load()
     ns = _ns()
+    if ns in _namespaces_ready:
+        return
+    timeout = _request_timeout()
     try:
-        _core.read_namespace(ns)
+        _core.read_namespace(ns, _request_timeout=timeout)
     except ApiException as exc:
         if getattr(exc, "status", None) == 404:
             body = client.V1Namespace(metadata=client.V1ObjectMeta(name=ns))
-            _core.create_namespace(body)
+            _core.create_namespace(body, _request_timeout=timeout)
         else:
             raise
+    _namespaces_ready.add(ns)
+
+
+def _request_timeout():
+    """Per-call timeout for Kubernetes API requests (None = client default)."""
+    try:
+        value = float(os.getenv("K8S_API_TIMEOUT_SECONDS", "5"))
+        return value if value > 0 else None
+    except (TypeError, ValueError):
+        return 5.0
 
 
 def _ttl_seconds():
@@ -102,26 +152,52 @@ def _extend_seconds():
         return 300
 
 
-def start_instance(*, user_id, challenge_id, image, tag=None, port=80):
-    """Create a deployment + service for a user challenge instance."""
-    _load()
-    _ensure_namespace()
-    ns = _ns()
-    name = _name(user_id, challenge_id)
-    full_image = f"{image}:{tag}" if tag else image
-    now = str(int(time.time()))
-
-    labels = _instance_labels(user_id, challenge_id, name)
-
+def _initial_ttl():
+    """TTL for a new instance, capped by the max lifetime."""
     ttl = _ttl_seconds()
     ttl_max = _ttl_max_seconds()
     if ttl and ttl_max:
         ttl = min(ttl, ttl_max)
-    annotations = {"created_at": now, "last_seen": now}
+    return ttl
+
+
+def _initial_annotations(now):
+    """Lifecycle annotations stamped on a new instance."""
+    annotations = {"created_at": str(now), "last_seen": str(now)}
+    ttl = _initial_ttl()
     if ttl:
-        annotations["expires_at"] = str(int(now) + ttl)
+        annotations["expires_at"] = str(now + ttl)
+    return annotations
+
+
+def _start_response(name, port, now):
+    """Response payload for a freshly created instance."""
+    ttl = _initial_ttl()
+    ttl_max = _ttl_max_seconds()
+    response = {"instance_id": name, "status": "starting", "port": port, "created_at": now}
+    if ttl:
+        response["expires_at"] = now + ttl
+        response["ttl_remaining"] = ttl
+    if ttl_max and response.get("ttl_remaining"):
+        response["ttl_remaining"] = min(response["ttl_remaining"], ttl_max)
+        response["ttl_max"] = ttl_max
+    return response
 
-    dep = client.V1Deployment(
+
+def _adopted_response(name, port, annotations, now):
+    """Response payload when start converges on an instance that already exists."""
+    response = {
+        "instance_id": name,
+        "status": "already-running",
+        "port": port,
+        # Identifies the Deployment, so callers can tell a retry of their own start apart
+        "created_at": _parse_created_at(annotations),
+    }
+    return _with_ttl(response, _parse_expires_at(annotations), now)
+
+
+def _deployment_body(name, labels, annotations, image, port):
+    return client.V1Deployment(
         metadata=client.V1ObjectMeta(
             name=name,
             labels=labels,
@@ -137,7 +213,7 @@ def start_instance(*, user_id, challenge_id, image, tag=None, port=80):
                     containers=[
                         client.V1Container(
                             name="instance",
-                            image=full_image,
+                            image=image,
                             ports=[client.V1ContainerPort(container_port=port)],
                         )
                     ]
@@ -146,7 +222,9 @@ def start_instance(*, user_id, challenge_id, image, tag=None, port=80):
         ),
     )
 
-    svc = client.V1Service(
+
+def _service_body(name, labels, port):
+    return client.V1Service(
         metadata=client.V1ObjectMeta(name=name, labels=labels),
         spec=client.V1ServiceSpec(
             type=os.getenv("K8S_SERVICE_TYPE", "LoadBalancer"),
@@ -155,29 +233,148 @@ def start_instance(*, user_id, challenge_id, image, tag=None, port=80):
         ),
     )
 
-    _apps.create_namespaced_deployment(ns, dep)
-    _core.create_namespaced_service(ns, svc)
 
-    response = {"instance_id": name, "status": "starting", "port": port}
-    if ttl:
-        response["expires_at"] = int(now) + ttl
-        response["ttl_remaining"] = ttl
-    if ttl_max and response.get("ttl_remaining"):
-        response["ttl_remaining"] = min(response["ttl_remaining"], ttl_max)
-        response["ttl_max"] = ttl_max
-    return response
+def _reusable(dep, image, port, now):
+    """Whether an existing deployment can be handed back for this start.
+
+    Expired instances and ones built from an older challenge config (image or
+    port changed since) cannot.
+    """
+    expires_at = _parse_expires_at(dep.metadata.annotations or {})
+    if expires_at is not None and now >= expires_at:
+        return False
+    pod_spec = dep.spec.template.spec if dep.spec and dep.spec.template else None
+    if not pod_spec or not pod_spec.containers:
+        return False
+    container = pod_spec.containers[0]
+    return container.image == image and port in [p.container_port for p in container.ports or []]
+
+
+def start_instance(*, user_id, challenge_id, image, tag=None, port=80, check_generations=False):
+    """Create a deployment + service for a user challenge instance.
+
+    Idempotent: names are deterministic, so a repeated start gets a 409 and
+    converges on the existing instance (re-creating its Service if a previous
+    attempt died between the two creates). A name that cannot be used yet
+    (its Deployment or Service is still terminating, or the existing instance
+    is expired or outdated) moves on to the next generation. Raises
+    InstanceBusy when every generation is taken.
+
+    Generation 0 is always tried first, so a caller that has lost track of
+    the instance (no session) passes ``check_generations`` to look for a live
+    one of any generation before creating another.
+    """
+    _load()
+    _ensure_namespace()
+    ns = _ns()
+    timeout = _request_timeout()
+    full_image = f"{image}:{tag}" if tag else image
+    now = int(time.time())
+
+    taken = set()
+    if check_generations:
+        adopted, taken = _adopt_any_generation(ns, user_id, challenge_id, full_image, port, now, timeout)
+        if adopted is not None:
+            return adopted
+
+    for generation in range(_MAX_GENERATIONS):
+        name = _name(user_id, challenge_id, generation)
+        if name in taken:
+            continue
+        labels = _instance_labels(user_id, challenge_id, name)
+        dep = _deployment_body(name, labels, _initial_annotations(now), full_image, port)
+        svc = _service_body(name, labels, port)
+        existing = None
+        try:
+            _apps.create_namespaced_deployment(ns, dep, _request_timeout=timeout)
+        except ApiException as exc:
+            if getattr(exc, "status", None) != 409:
+                raise
+            try:
+                existing = _apps.read_namespaced_deployment(name, ns, _request_timeout=timeout)
+            except ApiException as read_exc:
+                # Finished deleting between the create and the read
+                if getattr(read_exc, "status", None) == 404:
+                    continue
+                raise
+            if existing.metadata.deletion_timestamp:
+                continue
+            if not _reusable(existing, full_image, port, now):
+                stop_instance(name)
+                continue
+        if not _ensure_service(ns, svc, timeout, read_first=existing is not None):
+            # The old Service is still being torn down (e.g. waiting on the
+            # load balancer cleanup finalizer) and would take this one with it
+            stop_instance(name)
+            continue
+        if existing is not None:
+            return _adopted_response(name, port, existing.metadata.annotations or {}, now)
+        return _start_response(name, port, now)
+    raise InstanceBusy("Previous instances are still shutting down")
+
+
+def _adopt_any_generation(ns, user_id, challenge_id, image, port, now, timeout):
+    """Adopt the newest live instance of a user+challenge with one LIST.
+
+    Returns ``(response, taken)``: the adopted instance's response or None,
+    and the names that cannot be created right now. Other copies (outdated,
+    expired or duplicates) are deleted.
+    """
+    selector = _instance_selector(user_id, challenge_id)
+    deployments = _apps.list_namespaced_deployment(ns, label_selector=selector, _request_timeout=timeout)
+    deployments.items.sort(key=lambda dep: _parse_created_at(dep.metadata.annotations or {}) or 0, reverse=True)
+    adopted, taken = None, set()
+    for dep in deployments.items:
+        name = dep.metadata.name
+        taken.add(name)
+        if dep.metadata.deletion_timestamp:
+            continue
+        if adopted is None and _reusable(dep, image, port, now):
+            svc = _service_body(name, _instance_labels(user_id, challenge_id, name), port)
+            if _ensure_service(ns, svc, timeout, read_first=True):
+                adopted = _adopted_response(name, port, dep.metadata.annotations or {}, now)
+                continue
+        stop_instance(name)
+    return adopted, taken
+
+
+def _ensure_service(ns, svc, timeout, read_first=False):
+    """Make sure the instance's Service exists; return False if the one there is terminating.
+
+    A new instance creates first (one call). An adopted one probably has its
+    Service already, so it reads first and only creates on a 404.
+    """
+    name = svc.metadata.name
+    for _ in range(2):
+        if read_first:
+            try:
+                existing = _core.read_namespaced_service(name, ns, _request_timeout=timeout)
+            except ApiException as exc:
+                if getattr(exc, "status", None) != 404:
+                    raise
+            else:
+                return not existing.metadata.deletion_timestamp
+        try:
+            _core.create_namespaced_service(ns, svc, _request_timeout=timeout)
+            return True
+        except ApiException as exc:
+            if getattr(exc, "status", None) != 409:
+                raise
+        read_first = True
+    return False
 
 
 def stop_instance(instance_id):
     """Delete deployment and service by instance id."""
     _load()
     ns = _ns()
+    timeout = _request_timeout()
     try:
-        _apps.delete_namespaced_deployment(instance_id, ns)
+        _apps.delete_namespaced_deployment(instance_id, ns, _request_timeout=timeout)
     except ApiException:
         pass
     try:
-        _core.delete_namespaced_service(instance_id, ns)
+        _core.delete_namespaced_service(instance_id, ns, _request_timeout=timeout)
     except ApiException:
         pass
 
@@ -186,27 +383,22 @@ def stop_instances_for(user_id, challenge_id):
     """Delete all deployments/services for a user+challenge label set."""
     _load()
     ns = _ns()
-    selector = ",".join(
-        [
-            "component=user-instance",
-            f"user_id={user_id}",
-            f"challenge_id={challenge_id}",
-        ]
-    )
+    timeout = _request_timeout()
+    selector = _instance_selector(user_id, challenge_id)
     try:
-        deps = _apps.list_namespaced_deployment(ns, label_selector=selector)
+        deps = _apps.list_namespaced_deployment(ns, label_selector=selector, _request_timeout=timeout)
         for dep in deps.items:
             try:
-                _apps.delete_namespaced_deployment(dep.metadata.name, ns)
+                _apps.delete_namespaced_deployment(dep.metadata.name, ns, _request_timeout=timeout)
             except ApiException:
                 pass
     except ApiException:
         pass
     try:
-        svcs = _core.list_namespaced_service(ns, label_selector=selector)
+        svcs = _core.list_namespaced_service(ns, label_selector=selector, _request_timeout=timeout)
         for svc in svcs.items:
             try:
-                _core.delete_namespaced_service(svc.metadata.name, ns)
+                _core.delete_namespaced_service(svc.metadata.name, ns, _request_timeout=timeout)
             except ApiException:
                 pass
     except ApiException:
@@ -217,37 +409,105 @@ def find_existing_instance(user_id, challenge_id):
     """Find the newest instance for a user+challenge."""
     _load()
     ns = _ns()
-    selector = ",".join(
-        [
-            "component=user-instance",
-            f"user_id={user_id}",
-            f"challenge_id={challenge_id}",
-        ]
-    )
-    deployments = _apps.list_namespaced_deployment(ns, label_selector=selector)
+    timeout = _request_timeout()
+    selector = _instance_selector(user_id, challenge_id)
+    deployments = _apps.list_namespaced_deployment(ns, label_selector=selector, _request_timeout=timeout)
     if not deployments.items:
         return None
+    deployments.items.sort(key=lambda dep: _parse_created_at(dep.metadata.annotations or {}) or 0, reverse=True)
+    return deployments.items[0].metadata.name
 
-    def _created_at(dep):
+
+def list_instances():
+    """Describe every user instance using one LIST per resource kind."""
+    _load()
+    ns = _ns()
+    timeout = _request_timeout()
+    selector = "component=user-instance"
+    deps = _apps.list_namespaced_deployment(ns, label_selector=selector, _request_timeout=timeout)
+    svcs = _core.list_namespaced_service(ns, label_selector=selector, _request_timeout=timeout)
+    pods = _core.list_namespaced_pod(ns, label_selector=selector, _request_timeout=timeout)
+
+    svc_by_name = {svc.metadata.name: svc for svc in svcs.items}
+    pod_by_app = {}
+    for pod in pods.items:
+        pod_by_app.setdefault((pod.metadata.labels or {}).get("app"), pod)
+
+    instances = []
+    for dep in deps.items:
+        name = dep.metadata.name
+        labels = dep.metadata.labels or {}
         annotations = dep.metadata.annotations or {}
-        try:
-            return int(annotations.get("created_at", 0))
-        except (TypeError, ValueError):
-            return 0
+        pod = pod_by_app.get(name)
+        ip, port = _service_endpoint(svc_by_name.get(name), pod)
+        instances.append(
+            {
+                "instance_id": name,
+                "user_id": labels.get("user_id"),
+                "challenge_id": labels.get("challenge_id"),
+                "pod_phase": pod.status.phase if pod and pod.status else None,
+                "ip": ip,
+                "port": port,
+                "created_at": _parse_created_at(annotations),
+                "expires_at": _parse_expires_at(annotations),
+            }
+        )
+    return instances
+
+
+def list_inventory():
+    """Name-indexed deployments and services for every user instance (one LIST each)."""
+    _load()
+    ns = _ns()
+    timeout = _request_timeout()
+    selector = "component=user-instance"
+    deps = _apps.list_namespaced_deployment(ns, label_selector=selector, _request_timeout=timeout)
+    svcs = _core.list_namespaced_service(ns, label_selector=selector, _request_timeout=timeout)
+    deployments = {
+        dep.metadata.name: {
+            "labels": dep.metadata.labels or {},
+            "created_at": _parse_created_at(dep.metadata.annotations or {}),
+            "expires_at": _parse_expires_at(dep.metadata.annotations or {}),
+        }
+        for dep in deps.items
+    }
+    services = {}
+    for svc in svcs.items:
+        created = svc.metadata.creation_timestamp
+        services[svc.metadata.name] = {
+            "labels": svc.metadata.labels or {},
+            "created_at": int(created.timestamp()) if created else None,
+        }
+    return {"deployments": deployments, "services": services}
 
-    deployments.items.sort(key=_created_at, reverse=True)
-    return deployments.items[0].metadata.name
 
+def delete_resources(deployments=(), services=()):
+    """Delete deployments/services by name; return the names that failed.
 
-def extend_instance(instance_id, seconds=None):
-    """Extend TTL on an existing instance."""
+    Unlike stop_instance, errors are reported (a 404 counts as deleted).
+    """
     _load()
     ns = _ns()
-    extend_by = seconds if seconds is not None else _extend_seconds()
-    now = int(time.time())
+    timeout = _request_timeout()
+    failed = []
+    for name in deployments:
+        try:
+            _apps.delete_namespaced_deployment(name, ns, _request_timeout=timeout)
+        except ApiException as exc:
+            if getattr(exc, "status", None) != 404:
+                failed.append(name)
+    for name in services:
+        try:
+            _core.delete_namespaced_service(name, ns, _request_timeout=timeout)
+        except ApiException as exc:
+            if getattr(exc, "status", None) != 404:
+                failed.append(name)
+    return failed
+
 
-    dep = _apps.read_namespaced_deployment(instance_id, ns)
-    annotations = (dep.metadata.annotations or {}).copy()
+def _extended_annotations(annotations, now, extend_by):
+    """Return annotations with expires_at pushed back, capped by the max lifetime."""
+    annotations = dict(annotations)
     try:
         created_at = int(annotations.get("created_at", now))
     except (TypeError, ValueError):
@@ -260,9 +520,11 @@ def extend_instance(instance_id, seconds=None):
         new_expires = min(new_expires, created_at + ttl_max)
     annotations["last_seen"] = str(now)
     annotations["expires_at"] = str(new_expires)
+    return annotations
 
-    patch = {"metadata": {"annotations": annotations}}
-    _apps.patch_namespaced_deployment(instance_id, ns, patch)
+
+def _extend_response(instance_id, new_expires, now):
+    """Response payload after extending an instance."""
     remaining = max(new_expires - now, 0)
     ttl_max = _ttl_max_seconds()
     if ttl_max:
@@ -273,51 +535,135 @@ def extend_instance(instance_id, seconds=None):
     return response
 
 
-def get_status(instance_id):
-    """Return status, connection info, and TTL data for an instance."""
+def extend_instance(instance_id, seconds=None):
+    """Extend TTL on an existing instance."""
     _load()
     ns = _ns()
+    timeout = _request_timeout()
+    extend_by = seconds if seconds is not None else _extend_seconds()
+    now = int(time.time())
+
+    dep = _apps.read_namespaced_deployment(instance_id, ns, _request_timeout=timeout)
+    annotations = _extended_annotations(dep.metadata.annotations or {}, now, extend_by)
+
+    patch = {"metadata": {"annotations": annotations}}
+    _apps.patch_namespaced_deployment(instance_id, ns, patch, _request_timeout=timeout)
+    return _extend_response(instance_id, int(annotations["expires_at"]), now)
 
+
+def _parse_created_at(annotations):
+    """Read the created_at annotation as an int, or None when unset/invalid."""
     try:
-        dep = _apps.read_namespaced_deployment(instance_id, ns)
-    except ApiException:
-        return {"instance_id": instance_id, "status": "stopped", "ttl_remaining": 0}
+        return int(annotations.get("created_at", 0)) or None
+    except (TypeError, ValueError):
+        return None
 
-    annotations = dep.metadata.annotations or {}
-    now = int(time.time())
+
+def _parse_expires_at(annotations):
+    """Read the expires_at annotation as an int, or None when unset/invalid."""
     expires_at = annotations.get("expires_at")
-    if expires_at is not None:
-        try:
-            expires_at_int = int(expires_at)
-        except (TypeError, ValueError):
-            expires_at_int = None
-    else:
-        expires_at_int = None
+    if expires_at is None:
+        return None
+    try:
+        return int(expires_at)
+    except (TypeError, ValueError):
+        return None
 
-    if expires_at_int is not None and now >= expires_at_int:
-        stop_instance(instance_id)
-        return {"instance_id": instance_id, "status": "expired", "ttl_remaining": 0, "expires_at": expires_at_int}
 
-    svc = _core.read_namespaced_service(instance_id, ns)
-    pods = _core.list_namespaced_pod(ns, label_selector=f"app={instance_id}")
+def _public_host():
+    """Host players use for NodePort services, overriding node addresses."""
+    return os.getenv("K8S_PUBLIC_HOST", "").strip() or None
+
+
+def _needs_node_lookup(svc):
+    """Whether the endpoint of this service comes from the node address index."""
+    return bool(svc and svc.spec and svc.spec.type == "NodePort" and not _public_host())
+
+
+def _service_endpoint(svc, pod=None):
+    """Return the (ip, port) players connect to for a service.
+
+    LoadBalancer: ingress IP/hostname and service port. NodePort: the
+    allocated nodePort on K8S_PUBLIC_HOST or the pod's node address.
+    ClusterIP: the cluster IP and service port (in-cluster access only).
+    """
+    if not svc or not svc.spec:
+        return None, None
+    svc_port = svc.spec.ports[0] if svc.spec.ports else None
+    svc_type = svc.spec.type or "ClusterIP"
+
+    if svc_type == "NodePort":
+        port = svc_port.node_port if svc_port else None
+        ip = _public_host()
+        if not ip and pod and pod.spec and pod.spec.node_name:
+            _load()
+            ip = node_address(_core, pod.spec.node_name)
+        return ip, port
+
+    port = svc_port.port if svc_port else None
+    if svc_type == "ClusterIP":
+        return svc.spec.cluster_ip, port
 
     ip = None
     if svc.status and svc.status.load_balancer and svc.status.load_balancer.ingress:
-        ip = svc.status.load_balancer.ingress[0].ip
+        ingress = svc.status.load_balancer.ingress[0]
+        ip = ingress.ip or ingress.hostname
+    return ip, port
+
 
+def _status_response(instance_id, svc, pods, expires_at, now):
+    """Build the status payload from the service, pod list and expiry."""
     pod = pods.items[0] if pods.items else None
+    ip, port = _service_endpoint(svc, pod)
 
     response = {
         "instance_id": instance_id,
         "ip": ip,
         "pod_phase": pod.status.phase if pod else None,
-        "port": (svc.spec.ports[0].port if svc and svc.spec and svc.spec.ports else None),
+        "port": port,
     }
+    return _with_ttl(response, expires_at, now)
+
+
+def _with_ttl(response, expires_at, now):
+    """Add expires_at/ttl_remaining/ttl_max to a status payload."""
     ttl_max = _ttl_max_seconds()
-    if expires_at_int is not None:
-        response["expires_at"] = expires_at_int
-        remaining = max(expires_at_int - now, 0)
+    if expires_at is not None:
+        response["expires_at"] = expires_at
+        remaining = max(expires_at - now, 0)
         response["ttl_remaining"] = min(remaining, ttl_max) if ttl_max else remaining
         if ttl_max:
             response["ttl_max"] = ttl_max
     return response
+
+
+def get_status(instance_id):
+    """Return status, connection info, and TTL data for an instance."""
+    _load()
+    ns = _ns()
+    timeout = _request_timeout()
+
+    try:
+        dep = _apps.read_namespaced_deployment(instance_id, ns, _request_timeout=timeout)
+    except ApiException as exc:
+        # Anything but a 404 is an API problem, not a stopped instance
+        if getattr(exc, "status", None) != 404:
+            raise
+        return {"instance_id": instance_id, "status": "stopped", "ttl_remaining": 0}
+
+    annotations = dep.metadata.annotations or {}
+    now = int(time.time())
+    expires_at_int = _parse_expires_at(annotations)
+
+    if expires_at_int is not None and now >= expires_at_int:
+        stop_instance(instance_id)
+        return {"instance_id": instance_id, "status": "expired", "ttl_remaining": 0, "expires_at": expires_at_int}
+
+    try:
+        svc = _core.read_namespaced_service(instance_id, ns, _request_timeout=timeout)
+    except ApiException as exc:
+        if getattr(exc, "status", None) != 404:
+            raise
+        svc = None
+    pods = _core.list_namespaced_pod(ns, label_selector=f"app={instance_id}", _request_timeout=timeout)
+    return _status_response(instance_id, svc, pods, expires_at_int, now)
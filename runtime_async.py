@@ -0,0 +1,164 @@
+# plugins/dynamic_instances/runtime_async.py
+
+"""Asyncio runtime backend that fans out independent Kubernetes calls.
+
+Requires the optional ``kubernetes_asyncio`` package. Coroutines run on one
+background event loop per process; the sync functions at the bottom are
+drop-in replacements for the matching functions in ``runtime``.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+from kubernetes.config.config_exception import ConfigException
+from kubernetes_asyncio import client, config
+from kubernetes_asyncio.client.rest import ApiException
+from kubernetes_asyncio.config.config_exception import ConfigException as AsyncConfigException
+
+from .runtime import (
+    _instance_selector,
+    _needs_node_lookup,
+    _ns,
+    _parse_expires_at,
+    _request_timeout,
+    _status_response,
+)
+
+_core = None
+_apps = None
+_loop = None
+_loop_guard = threading.Lock()
+
+
+async def _load():
+    """Initialize async Kubernetes clients once per process (on the loop thread)."""
+    global _core, _apps
+    if _core and _apps:
+        return
+    try:
+        config.load_incluster_config()
+    except Exception:
+        # Load from kubeconfig as fallback
+        kubeconfig_path = os.getenv("KUBECONFIG")
+        try:
+            if kubeconfig_path:
+                await config.load_kube_config(config_file=kubeconfig_path)
+            else:
+                await config.load_kube_config()
+        except AsyncConfigException as exc:
+            # Surface the same exception type the sync backend raises
+            raise ConfigException(str(exc)) from exc
+    api_client = client.ApiClient()
+    _core = client.CoreV1Api(api_client)
+    _apps = client.AppsV1Api(api_client)
+
+
+async def _ignore_api_errors(coro):
+    """Await a call, swallowing ApiException like the sync deletes do."""
+    try:
+        return await coro
+    except ApiException:
+        return None
+
+
+async def stop_instance_async(instance_id):
+    """Delete deployment and service concurrently."""
+    await _load()
+    ns = _ns()
+    timeout = _request_timeout()
+    await asyncio.gather(
+        _ignore_api_errors(_apps.delete_namespaced_deployment(instance_id, ns, _request_timeout=timeout)),
+        _ignore_api_errors(_core.delete_namespaced_service(instance_id, ns, _request_timeout=timeout)),
+    )
+
+
+async def stop_instances_for_async(user_id, challenge_id):
+    """List and delete all deployments/services for a user+challenge in parallel."""
+    await _load()
+    ns = _ns()
+    timeout = _request_timeout()
+    selector = _instance_selector(user_id, challenge_id)
+    deps, svcs = await asyncio.gather(
+        _ignore_api_errors(_apps.list_namespaced_deployment(ns, label_selector=selector, _request_timeout=timeout)),
+        _ignore_api_errors(_core.list_namespaced_service(ns, label_selector=selector, _request_timeout=timeout)),
+    )
+    deletes = []
+    if deps is not None:
+        deletes += [
+            _ignore_api_errors(_apps.delete_namespaced_deployment(dep.metadata.name, ns, _request_timeout=timeout))
+            for dep in deps.items
+        ]
+    if svcs is not None:
+        deletes += [
+            _ignore_api_errors(_core.delete_namespaced_service(svc.metadata.name, ns, _request_timeout=timeout))
+            for svc in svcs.items
+        ]
+    if deletes:
+        await asyncio.gather(*deletes)
+
+
+async def get_status_async(instance_id):
+    """Read deployment, service and pods in one concurrent round trip."""
+    await _load()
+    ns = _ns()
+    timeout = _request_timeout()
+    dep, svc, pods = await asyncio.gather(
+        _apps.read_namespaced_deployment(instance_id, ns, _request_timeout=timeout),
+        _core.read_namespaced_service(instance_id, ns, _request_timeout=timeout),
+        _core.list_namespaced_pod(ns, label_selector=f"app={instance_id}", _request_timeout=timeout),
+        return_exceptions=True,
+    )
+
+    if isinstance(dep, ApiException) and dep.status == 404:
+        return {"instance_id": instance_id, "status": "stopped", "ttl_remaining": 0}
+    if isinstance(dep, BaseException):
+        # Anything but a 404 is an API problem, not a stopped instance
+        raise dep
+
+    annotations = dep.metadata.annotations or {}
+    now = int(time.time())
+    expires_at_int = _parse_expires_at(annotations)
+
+    if expires_at_int is not None and now >= expires_at_int:
+        await stop_instance_async(instance_id)
+        return {"instance_id": instance_id, "status": "expired", "ttl_remaining": 0, "expires_at": expires_at_int}
+
+    if isinstance(svc, ApiException) and svc.status == 404:
+        svc = None
+    for result in (svc, pods):
+        if isinstance(result, BaseException):
+            raise result
+    if _needs_node_lookup(svc):
+        # The node index uses the sync client and may wait for its first LIST; keep it off the loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, _status_response, instance_id, svc, pods, expires_at_int, now
+        )
+    return _status_response(instance_id, svc, pods, expires_at_int, now)
+
+
+def _run(coro):
+    """Run a coroutine on the shared background loop and wait for its result."""
+    global _loop
+    with _loop_guard:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="dynamic-instances-k8s", daemon=True)
+            thread.start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+def stop_instance(instance_id):
+    """Sync shim for stop_instance_async."""
+    return _run(stop_instance_async(instance_id))
+
+
+def stop_instances_for(user_id, challenge_id):
+    """Sync shim for stop_instances_for_async."""
+    return _run(stop_instances_for_async(user_id, challenge_id))
+
+
+def get_status(instance_id):
+    """Sync shim for get_status_async."""
+    return _run(get_status_async(instance_id))
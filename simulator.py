@@ -0,0 +1,255 @@
+# plugins/dynamic_instances/simulator.py
+
+"""In-memory simulated cluster for load testing the routes without Kubernetes.
+
+Models what matters for the plugin's own logic: instances sit in Pending until
+scheduled onto a node with free capacity, then for a sampled start latency
+(plus an image pull the first time a node runs an image), then Running. TTL
+annotations behave exactly like the Kubernetes backend, and each API call can
+be given latency and a random server error rate.
+
+State is per process; run load tests against a single CTFd worker.
+"""
+
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from itertools import count
+
+from kubernetes.client import ApiException
+
+from .backends import RuntimeBackend
+from .runtime import (
+    _adopted_response,
+    _extend_response,
+    _extend_seconds,
+    _extended_annotations,
+    _initial_annotations,
+    _name,
+    _parse_expires_at,
+    _start_response,
+    _with_ttl,
+)
+
+
+def _env_float(name, default):
+    try:
+        value = float(os.getenv(name, str(default)))
+        return value if value >= 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name, default):
+    try:
+        value = int(os.getenv(name, str(default)))
+        return value if value > 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+class SimulatedBackend(RuntimeBackend):
+    """Stateful fake cluster implementing the runtime backend interface."""
+
+    name = "simulator"
+
+    def __init__(self):
+        seed = os.getenv("K8S_SIM_SEED")
+        self._rng = random.Random(int(seed) if seed and seed.isdigit() else None)
+        self._lock = threading.Lock()
+        self._seq = count()
+        self._instances = {}
+        # (node, image) pairs whose image is already on the node
+        self._pulled = set()
+        self.nodes = _env_int("K8S_SIM_NODES", 3)
+        self.slots_per_node = _env_int("K8S_SIM_SLOTS_PER_NODE", 20)
+        self.start_seconds = _env_float("K8S_SIM_START_SECONDS", 2.0)
+        self.pull_seconds = _env_float("K8S_SIM_PULL_SECONDS", 8.0)
+        self.api_latency = _env_float("K8S_SIM_API_LATENCY_MS", 0.0) / 1000.0
+        self.error_rate = min(_env_float("K8S_SIM_ERROR_RATE", 0.0), 1.0)
+
+    # -- simulation helpers -------------------------------------------------
+
+    def _call(self):
+        """Simulate one API round trip: latency and random server errors."""
+        if self.api_latency:
+            time.sleep(self.api_latency)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise ApiException(status=500, reason="Simulated API error")
+
+    def _sample(self, mean):
+        """Lognormal sample with the given mean (long tail like real pulls)."""
+        if mean <= 0:
+            return 0.0
+        sigma = 0.5
+        return self._rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+
+    def _schedule(self, now):
+        """Bind unscheduled instances to nodes with free slots, oldest first."""
+        used = Counter(inst["node"] for inst in self._instances.values() if inst["node"] is not None)
+        waiting = sorted(
+            (inst for inst in self._instances.values() if inst["node"] is None),
+            key=lambda inst: inst["seq"],
+        )
+        for inst in waiting:
+            free = [n for n in range(self.nodes) if used[n] < self.slots_per_node]
+            if not free:
+                break
+            node = min(free, key=lambda n: used[n])
+            used[node] += 1
+            inst["node"] = node
+            latency = self._sample(self.start_seconds)
+            if (node, inst["image"]) not in self._pulled:
+                latency += self._sample(self.pull_seconds)
+                self._pulled.add((node, inst["image"]))
+            inst["ready_at"] = now + latency
+
+    @staticmethod
+    def _phase(inst, now):
+        if inst["node"] is None or now < inst["ready_at"]:
+            return "Pending"
+        return "Running"
+
+    @staticmethod
+    def _ip(inst):
+        return f"10.0.{inst['node']}.{inst['seq'] % 250 + 1}"
+
+    # -- backend interface --------------------------------------------------
+
+    def start_instance(self, *, user_id, challenge_id, image, tag=None, port=80, check_generations=False):
+        self._call()
+        now = int(time.time())
+        # Deletes are instant here, so generation 0 is never still terminating
+        name = _name(user_id, challenge_id)
+        full_image = f"{image}:{tag}" if tag else image
+        with self._lock:
+            existing = self._instances.get(name)
+            expires_at = _parse_expires_at(existing["annotations"]) if existing else None
+            # Expired or outdated (image/port changed) instances are replaced, like the Kubernetes backend does
+            if (
+                existing is not None
+                and (expires_at is None or now < expires_at)
+                and existing["image"] == full_image
+                and existing["port"] == port
+            ):
+                return _adopted_response(name, existing["port"], existing["annotations"], now)
+            self._instances[name] = {
+                "name": name,
+                "seq": next(self._seq),
+                "user_id": str(user_id),
+                "challenge_id": str(challenge_id),
+                "image": full_image,
+                "port": port,
+                "annotations": _initial_annotations(now),
+                "node": None,
+                "ready_at": None,
+            }
+            self._schedule(time.time())
+        return _start_response(name, port, now)
+
+    def stop_instance(self, instance_id):
+        self._call()
+        with self._lock:
+            self._instances.pop(instance_id, None)
+
+    def stop_instances_for(self, user_id, challenge_id):
+        self._call()
+        with self._lock:
+            for name in [
+                name
+                for name, inst in self._instances.items()
+                if inst["user_id"] == str(user_id) and inst["challenge_id"] == str(challenge_id)
+            ]:
+                del self._instances[name]
+
+    def find_existing_instance(self, user_id, challenge_id):
+        self._call()
+        with self._lock:
+            matches = [
+                inst
+                for inst in self._instances.values()
+                if inst["user_id"] == str(user_id) and inst["challenge_id"] == str(challenge_id)
+            ]
+        if not matches:
+            return None
+        return max(matches, key=lambda inst: inst["seq"])["name"]
+
+    def extend_instance(self, instance_id, seconds=None):
+        self._call()
+        extend_by = seconds if seconds is not None else _extend_seconds()
+        now = int(time.time())
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if inst is None:
+                raise ApiException(status=404, reason="Not Found")
+            inst["annotations"] = _extended_annotations(inst["annotations"], now, extend_by)
+            new_expires = int(inst["annotations"]["expires_at"])
+        return _extend_response(instance_id, new_expires, now)
+
+    def get_status(self, instance_id):
+        self._call()
+        now = int(time.time())
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if inst is None:
+                return {"instance_id": instance_id, "status": "stopped", "ttl_remaining": 0}
+            expires_at = _parse_expires_at(inst["annotations"])
+            if expires_at is not None and now >= expires_at:
+                del self._instances[instance_id]
+                self._schedule(time.time())
+                return {"instance_id": instance_id, "status": "expired", "ttl_remaining": 0, "expires_at": expires_at}
+            self._schedule(time.time())
+            phase = self._phase(inst, time.time())
+            response = {
+                "instance_id": instance_id,
+                "ip": self._ip(inst) if phase == "Running" else None,
+                "pod_phase": phase,
+                "port": inst["port"],
+            }
+        return _with_ttl(response, expires_at, now)
+
+    def list_instances(self):
+        self._call()
+        now = time.time()
+        with self._lock:
+            self._schedule(now)
+            instances = []
+            for inst in self._instances.values():
+                phase = self._phase(inst, now)
+                instances.append(
+                    {
+                        "instance_id": inst["name"],
+                        "user_id": inst["user_id"],
+                        "challenge_id": inst["challenge_id"],
+                        "pod_phase": phase,
+                        "ip": self._ip(inst) if phase == "Running" else None,
+                        "port": inst["port"],
+                        "created_at": int(inst["annotations"]["created_at"]),
+                        "expires_at": _parse_expires_at(inst["annotations"]),
+                    }
+                )
+        return instances
+
+    def list_inventory(self):
+        self._call()
+        with self._lock:
+            resources = {
+                name: {
+                    "labels": {"user_id": inst["user_id"], "challenge_id": inst["challenge_id"]},
+                    "created_at": int(inst["annotations"]["created_at"]),
+                    "expires_at": _parse_expires_at(inst["annotations"]),
+                }
+                for name, inst in self._instances.items()
+            }
+        # The simulator creates and deletes both kinds together
+        return {"deployments": resources, "services": dict(resources)}
+
+    def delete_resources(self, deployments=(), services=()):
+        self._call()
+        with self._lock:
+            for name in list(deployments) + list(services):
+                self._instances.pop(name, None)
+        return []
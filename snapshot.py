@@ -0,0 +1,153 @@
+# plugins/dynamic_instances/snapshot.py
+
+"""Cached snapshot of live instances for the admin dashboard.
+
+The snapshot is shared through the CTFd cache so refreshes cost one LIST per
+resource kind per interval across all workers, however many admins are
+watching. Sorting, filtering and paging happen in memory on the snapshot.
+"""
+
+import os
+import time
+
+from CTFd.cache import cache
+
+from .backends import get_backend
+from .breaker import BackendUnavailable
+
+_SNAPSHOT_KEY = "dynamic_instances:snapshot"
+_REFRESH_KEY = "dynamic_instances:snapshot_refresh"
+
+# How long a request without any snapshot waits for another worker's cold refresh
+_COLD_WAIT_SECONDS = 5
+_POLL_INTERVAL = 0.25
+
+SORT_KEYS = {"instance_id", "user_id", "challenge_id", "pod_phase", "age", "ttl_remaining"}
+
+
+class SnapshotWarmingUp(BackendUnavailable):
+    """No snapshot exists yet and another worker is still building the first one."""
+
+
+def _snapshot_seconds():
+    """Maximum age of the cached snapshot before a refresh."""
+    try:
+        value = int(os.getenv("K8S_SNAPSHOT_SECONDS", "10"))
+        return value if value > 0 else 10
+    except (TypeError, ValueError):
+        return 10
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def refresh_snapshot():
+    """LIST the cluster and store a fresh snapshot."""
+    instances = get_backend().list_instances()
+    for item in instances:
+        item["user_id"] = _to_int(item.get("user_id"))
+        item["challenge_id"] = _to_int(item.get("challenge_id"))
+    snapshot = {"taken_at": int(time.time()), "instances": instances}
+    # Keep the old snapshot around past its refresh time so it can be served stale
+    cache.set(_SNAPSHOT_KEY, snapshot, timeout=_snapshot_seconds() * 10)
+    return snapshot
+
+
+def get_snapshot(force=False):
+    """Return the cached snapshot, refreshing it when it is too old.
+
+    Only one worker refreshes per interval; the others keep serving the
+    previous snapshot until the new one lands. With no snapshot at all (cold
+    start, or nobody looked for a while) the others wait briefly for it and
+    then raise SnapshotWarmingUp instead of all LISTing the cluster.
+    """
+    interval = _snapshot_seconds()
+    snapshot = cache.get(_SNAPSHOT_KEY)
+    if snapshot is None and not force and not cache.add(_REFRESH_KEY, 1, timeout=interval):
+        return _await_cold_snapshot()
+    fresh = snapshot is not None and time.time() - snapshot["taken_at"] < interval
+    if force or snapshot is None or (not fresh and cache.add(_REFRESH_KEY, 1, timeout=interval)):
+        try:
+            snapshot = refresh_snapshot()
+        except Exception as exc:
+            if snapshot is None:
+                # Let the next request retry the cold refresh instead of waiting out the lock
+                cache.delete(_REFRESH_KEY)
+                raise
+            if not isinstance(exc, BackendUnavailable):
+                raise
+            # Keep serving the previous snapshot while the API is degraded
+    return snapshot
+
+
+def _await_cold_snapshot():
+    deadline = time.time() + _COLD_WAIT_SECONDS
+    while time.time() < deadline:
+        time.sleep(_POLL_INTERVAL)
+        snapshot = cache.get(_SNAPSHOT_KEY)
+        if snapshot is not None:
+            return snapshot
+    raise SnapshotWarmingUp("Instance snapshot is still being built")
+
+
+def update_snapshot(removed=(), updated=None):
+    """Apply admin actions to the cached snapshot without a new LIST."""
+    snapshot = cache.get(_SNAPSHOT_KEY)
+    if snapshot is None:
+        return
+    removed = set(removed)
+    updated = updated or {}
+    instances = []
+    for item in snapshot["instances"]:
+        if item["instance_id"] in removed:
+            continue
+        if item["instance_id"] in updated:
+            item = {**item, **updated[item["instance_id"]]}
+        instances.append(item)
+    snapshot["instances"] = instances
+    cache.set(_SNAPSHOT_KEY, snapshot, timeout=_snapshot_seconds() * 10)
+
+
+def _with_timing(item, now):
+    """Add age and TTL remaining as of ``now``."""
+    row = dict(item)
+    created_at = row.get("created_at")
+    expires_at = row.get("expires_at")
+    row["age"] = max(now - created_at, 0) if created_at else None
+    row["ttl_remaining"] = max(expires_at - now, 0) if expires_at is not None else None
+    return row
+
+
+def query_snapshot(
+    *, user_id=None, challenge_id=None, phase=None, q=None, sort="age", order="desc", page=1, per_page=50
+):
+    """Filter, sort and paginate the snapshot; returns (rows, total, taken_at)."""
+    snapshot = get_snapshot()
+    now = int(time.time())
+    rows = []
+    for item in snapshot["instances"]:
+        if user_id is not None and item.get("user_id") != user_id:
+            continue
+        if challenge_id is not None and item.get("challenge_id") != challenge_id:
+            continue
+        if phase and (item.get("pod_phase") or "").lower() != phase.lower():
+            continue
+        if q and q.lower() not in item["instance_id"].lower():
+            continue
+        rows.append(_with_timing(item, now))
+
+    if sort not in SORT_KEYS:
+        sort = "age"
+    # Missing values sort last regardless of direction
+    present = [row for row in rows if row.get(sort) is not None]
+    missing = [row for row in rows if row.get(sort) is None]
+    present.sort(key=lambda row: row[sort], reverse=(order == "desc"))
+    rows = present + missing
+
+    total = len(rows)
+    start = (page - 1) * per_page
+    return rows[start : start + per_page], total, snapshot["taken_at"]
@@ -0,0 +1,190 @@
+// k8s_admin_instances.js
+// Admin dashboard for live Kubernetes-backed instances
+
+(() => {
+  "use strict";
+
+  const root = document.getElementById("k8s-admin-instances");
+  if (!root) return;
+
+  const base = "/plugins/dynamic_instances/admin/instances";
+  const state = { page: 1, perPage: 50, sort: "age", order: "desc", pages: 1 };
+  const selected = new Set();
+  let filterTimer = null;
+
+  function csrfNonce() {
+    return root.dataset.csrfNonce || (window.CTFd && CTFd.config && CTFd.config.csrfNonce) || "";
+  }
+
+  async function api(path, method = "GET", payload = null) {
+    const res = await fetch(`${base}${path}`, {
+      method,
+      credentials: "same-origin",
+      headers: {
+        "Content-Type": "application/json",
+        "CSRF-Token": csrfNonce(),
+      },
+      body: payload ? JSON.stringify(payload) : null,
+    });
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    return res.json();
+  }
+
+  function escapeHtml(value) {
+    return String(value ?? "").replace(/[&<>"']/g, (c) => ({
+      "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;",
+    })[c]);
+  }
+
+  // Seconds to a short "1h 5m" / "42s" string.
+  function duration(seconds) {
+    if (typeof seconds !== "number") return "";
+    const h = Math.floor(seconds / 3600);
+    const m = Math.floor((seconds % 3600) / 60);
+    if (h) return `${h}h ${m}m`;
+    if (m) return `${m}m`;
+    return `${seconds}s`;
+  }
+
+  function queryParams() {
+    const params = new URLSearchParams({
+      page: state.page,
+      per_page: state.perPage,
+      sort: state.sort,
+      order: state.order,
+    });
+    const q = document.getElementById("filter-q").value.trim();
+    const user = document.getElementById("filter-user").value.trim();
+    const challenge = document.getElementById("filter-challenge").value.trim();
+    const phase = document.getElementById("filter-phase").value;
+    if (q) params.set("q", q);
+    if (user) params.set("user_id", user);
+    if (challenge) params.set("challenge_id", challenge);
+    if (phase) params.set("phase", phase);
+    return params.toString();
+  }
+
+  function renderRows(rows) {
+    const body = document.getElementById("instances-body");
+    body.innerHTML = rows
+      .map((row) => {
+        const id = escapeHtml(row.instance_id);
+        const user = row.user_name ? `${escapeHtml(row.user_name)} (${row.user_id})` : escapeHtml(row.user_id);
+        const chal = row.challenge_name
+          ? `${escapeHtml(row.challenge_name)} (${row.challenge_id})`
+          : escapeHtml(row.challenge_id);
+        const endpoint = row.ip ? `${escapeHtml(row.ip)}${row.port ? `:${row.port}` : ""}` : "";
+        const checked = selected.has(row.instance_id) ? "checked" : "";
+        return `<tr>
+          <td><input type="checkbox" class="row-select" data-id="${id}" ${checked}></td>
+          <td><code>${id}</code></td>
+          <td>${user}</td>
+          <td>${chal}</td>
+          <td>${escapeHtml(row.pod_phase || "")}</td>
+          <td>${endpoint}</td>
+          <td>${duration(row.age)}</td>
+          <td>${duration(row.ttl_remaining)}</td>
+          <td class="text-end">
+            <button class="btn btn-sm btn-outline-secondary row-extend" data-id="${id}"><i class="fas fa-clock"></i></button>
+            <button class="btn btn-sm btn-outline-danger row-stop" data-id="${id}"><i class="fas fa-stop"></i></button>
+          </td>
+        </tr>`;
+      })
+      .join("");
+  }
+
+  function updateBulkButtons() {
+    const none = selected.size === 0;
+    document.getElementById("bulk-stop").disabled = none;
+    document.getElementById("bulk-extend").disabled = none;
+  }
+
+  async function refresh() {
+    const data = await api(`/data?${queryParams()}`);
+    const meta = data.meta || {};
+    state.pages = Math.max(meta.pages || 1, 1);
+    renderRows(data.data || []);
+    document.getElementById("page-label").textContent = `${state.page} / ${state.pages}`;
+    const taken = meta.snapshot_at ? new Date(meta.snapshot_at * 1000).toLocaleTimeString() : "";
+    document.getElementById("instances-meta").textContent = `${meta.total || 0} instances, snapshot ${taken}`;
+    updateBulkButtons();
+  }
+
+  async function stop(ids) {
+    if (!ids.length || !window.confirm(`Stop ${ids.length} instance(s)?`)) return;
+    await api("/stop", "POST", { instance_ids: ids });
+    ids.forEach((id) => selected.delete(id));
+    await refresh();
+  }
+
+  async function extend(ids) {
+    if (!ids.length) return;
+    await api("/extend", "POST", { instance_ids: ids });
+    await refresh();
+  }
+
+  root.addEventListener("click", (event) => {
+    const target = event.target instanceof HTMLElement ? event.target : null;
+    if (!target) return;
+    const header = target.closest("th.sortable");
+    if (header) {
+      const sort = header.dataset.sort;
+      state.order = state.sort === sort && state.order === "desc" ? "asc" : "desc";
+      state.sort = sort;
+      refresh().catch(() => {});
+      return;
+    }
+    const rowStop = target.closest(".row-stop");
+    if (rowStop) {
+      stop([rowStop.dataset.id]).catch(() => {});
+      return;
+    }
+    const rowExtend = target.closest(".row-extend");
+    if (rowExtend) {
+      extend([rowExtend.dataset.id]).catch(() => {});
+      return;
+    }
+    if (target.closest("#bulk-stop")) stop([...selected]).catch(() => {});
+    if (target.closest("#bulk-extend")) extend([...selected]).catch(() => {});
+    if (target.id === "page-prev" && state.page > 1) {
+      state.page -= 1;
+      refresh().catch(() => {});
+    }
+    if (target.id === "page-next" && state.page < state.pages) {
+      state.page += 1;
+      refresh().catch(() => {});
+    }
+  });
+
+  root.addEventListener("change", (event) => {
+    const target = event.target;
+    if (!(target instanceof HTMLInputElement || target instanceof HTMLSelectElement)) return;
+    if (target.classList.contains("row-select")) {
+      if (target.checked) selected.add(target.dataset.id);
+      else selected.delete(target.dataset.id);
+      updateBulkButtons();
+    } else if (target.id === "select-all") {
+      root.querySelectorAll(".row-select").forEach((box) => {
+        box.checked = target.checked;
+        if (target.checked) selected.add(box.dataset.id);
+        else selected.delete(box.dataset.id);
+      });
+      updateBulkButtons();
+    } else if (target.id === "filter-phase") {
+      state.page = 1;
+      refresh().catch(() => {});
+    }
+  });
+
+  root.addEventListener("input", (event) => {
+    if (!(event.target instanceof HTMLInputElement) || !event.target.id.startsWith("filter-")) return;
+    clearTimeout(filterTimer);
+    filterTimer = setTimeout(() => {
+      state.page = 1;
+      refresh().catch(() => {});
+    }, 300);
+  });
+
+  refresh().catch(() => {});
+  setInterval(() => refresh().catch(() => {}), 10000);
+})();
@@ -140,7 +140,12 @@
     });
 
     if (!res.ok) {
-      throw new Error(`HTTP ${res.status}`);
+      let message = `HTTP ${res.status}`;
+      try {
+        const body = await res.json();
+        if (body && body.message) message = body.message;
+      } catch (_) {}
+      throw new Error(message);
     }
 
     const data = await res.json();
@@ -230,6 +235,21 @@
     }
   }
 
+  // Show (or clear, with no text) a one-off message above the connection info.
+  function showNotice(text, level = "info") {
+    const el = document.getElementById("instance-notice");
+    if (!el) return;
+    el.classList.remove("alert-info", "alert-warning", "alert-danger");
+    if (!text) {
+      el.textContent = "";
+      el.style.display = "none";
+      return;
+    }
+    el.classList.add(`alert-${level}`);
+    el.textContent = text;
+    el.style.display = "";
+  }
+
   function buildLink(host, port) {
     if (!host) return null;
     const hasScheme = /^https?:\/\//i.test(host);
@@ -242,19 +262,21 @@
   function renderTtl(el, data) {
     const ttlRemaining = data.ttl_remaining;
     const expiresAt = data.expires_at;
+    // Served from the last known status while the cluster API is degraded
+    const staleNote = data.stale ? " (status may be out of date)" : "";
     if (typeof ttlRemaining === "number") {
         const mins = Math.ceil(ttlRemaining / 60);
-        el.textContent = `Time remaining: ${mins} min`;
+        el.textContent = `Time remaining: ${mins} min${staleNote}`;
         return;
     }
     if (typeof expiresAt === "number") {
         const now = Math.floor(Date.now() / 1000);
         const remaining = Math.max(expiresAt - now, 0);
         const mins = Math.ceil(remaining / 60);
-        el.textContent = `Time remaining: ${mins} min`;
+        el.textContent = `Time remaining: ${mins} min${staleNote}`;
         return;
     }
-    el.textContent = "";
+    el.textContent = staleNote.trim();
   }
 
   // Poll control for the active modal.
@@ -288,6 +310,7 @@
     if (instanceByChallenge.get(challengeId)) return;
     startInFlight = true;
     if (startBtn) startBtn.disabled = true;
+    showNotice(null);
     try {
       const data = await api("start", "POST", {
         challenge_id: challengeId,
@@ -297,9 +320,25 @@
         instanceByChallenge.set(challengeId, data.instance_id);
         saveInstanceId(data.instance_id);
       }
+      // The instance limit shut down the least recently used instance(s),
+      // which in team scope may belong to a teammate
+      if (Array.isArray(data.evicted) && data.evicted.length) {
+        data.evicted.forEach((item) => {
+          if (item.owned) instanceByChallenge.delete(item.challenge_id);
+        });
+        const described = data.evicted.map((item) =>
+          item.owned
+            ? `your instance for ${item.challenge_name}`
+            : `${item.user_name || "a teammate"}'s instance for ${item.challenge_name}`
+        );
+        showNotice(`Instance limit reached: stopped ${described.join(", ")}.`, "warning");
+      }
       setButtons(true);
       updateStatus({ ...data, status: data.status || "creating" });
       startPolling();
+    } catch (err) {
+      setButtons(false);
+      showNotice(err.message, "danger");
     } finally {
       startInFlight = false;
       if (startBtn) startBtn.disabled = false;